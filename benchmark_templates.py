@@ -0,0 +1,62 @@
+"""
+Template Benchmark for ETD UGM Crawler
+Per-request render cost of the web pages when their source is compiled on every request
+(the old render_template_string path) versus rendering the templates compiled at startup
+
+Usage: python benchmark_templates.py [app.py|etd-crawler.py] [rows]
+"""
+
+import sys
+import time
+import importlib.util
+from flask import render_template, render_template_string
+
+
+def load_app(path):
+    # Imported by path, since etd-crawler.py is not a valid module name
+    spec = importlib.util.spec_from_file_location("benchmarked_app", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def per_call_ms(render, seconds=1.0):
+    """Median milliseconds per call over batches run for about `seconds`"""
+    render()  # Warm up
+    timings = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline or len(timings) < 5:
+        start = time.perf_counter()
+        for _ in range(10):
+            render()
+        timings.append((time.perf_counter() - start) * 100)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else "app.py"
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    module = load_app(path)
+
+    pdfs = [
+        {"id": str(doc_id), "title": f"ANALISIS KINERJA KEUANGAN DAERAH KABUPATEN {doc_id}",
+         "date": "2025-01-01 00:00:00", "filename": f"{doc_id}.pdf"}
+        for doc_id in range(1, rows + 1)
+    ]
+    pages = {
+        "ugm.html": (module.UGM_PAGE_TEMPLATE, dict(
+            result=None, crawl_active=False, jobs=[], follow={}, refresh={}, refresh_max_age_days=30,
+            session_state={}, retry_counts={"retrying": 0, "dead": 0}, retry_max_attempts=5,
+            dead_letters=[], pdf_count=0, pdfs=[], showing_count=0, search_term="")),
+        "database.html": (module.DATABASE_PAGE_TEMPLATE, dict(
+            pdfs=pdfs, start=0, total=rows, limit=rows, page_sizes=module.DATABASE_PAGE_SIZES, page_args={},
+            pdf_count=rows, search_term="", base_url=module.BASE_URL, fuzzy=False, duplicates_only=False,
+            duplicate_groups=0, same_file={}, ranked=False)),
+    }
+
+    with module.app.test_request_context("/ugm/database"):
+        for name, (source, context) in pages.items():
+            before = per_call_ms(lambda: render_template_string(source, **context))
+            after = per_call_ms(lambda: render_template(name, **context))
+            print(f"{name:14} compiled per request {before:7.3f} ms | precompiled {after:7.3f} ms | {before / after:5.1f}x")
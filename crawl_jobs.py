@@ -0,0 +1,271 @@
+"""
+Crawl Jobs for ETD UGM Crawler
+Persistent crawl job queue: each job keeps its range, cursor and counters,
+so queued crawls survive restarts and an interrupted crawl resumes where it stopped
+"""
+
+import time
+import heapq
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlJobs:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                owner TEXT NOT NULL,
+                start_id INTEGER NOT NULL,
+                end_id INTEGER NOT NULL,
+                cursor INTEGER NOT NULL,
+                found INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'running',
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+        try:
+            # "linear" walks the range in order; "density" visits blocks by expected yield
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN strategy TEXT NOT NULL DEFAULT 'linear'")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created REAL NOT NULL,
+                message TEXT NOT NULL,
+                delivered INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS alert_chats (
+                chat_id INTEGER PRIMARY KEY,
+                added REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.cancelled = set()  # Cancellations seen by this process, checked on every ID
+
+    def create(self, start_id, end_id, owner, status="running", strategy="linear"):
+        """Record a new job; its cursor is the last committed ID"""
+        now = time.time()
+        with self.lock, self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO jobs (owner, start_id, end_id, cursor, status, strategy, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (owner, start_id, end_id, start_id - 1, status, strategy, now, now),
+            )
+        return self.get(cur.lastrowid)
+
+    def enqueue(self, start_id, end_id, owner, strategy="linear"):
+        return self.create(start_id, end_id, owner, status="queued", strategy=strategy)
+
+    def claim_next(self, owner):
+        """Mark this owner's next job running and return it; interrupted or paused jobs come before queued ones"""
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT * FROM jobs WHERE owner = ? AND status IN ('running', 'paused', 'queued') "
+                "ORDER BY status = 'queued', id LIMIT 1",
+                (owner,),
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', updated = ? WHERE id = ?", (time.time(), row["id"])
+            )
+        return dict(row, status="running")
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def checkpoint(self, job_id, cursor, found):
+        """Commit the cursor; returns False once the job has been cancelled (possibly by another process)"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET cursor = ?, found = ?, updated = ? WHERE id = ?",
+                (cursor, found, time.time(), job_id),
+            )
+            status = self.conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            if status == "cancelled":
+                self.cancelled.add(job_id)
+        return status != "cancelled"
+
+    def set_status(self, job_id, status):
+        """Switch a live job between running and paused; a cancelled job stays cancelled"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, updated = ? WHERE id = ? AND status IN ('running', 'paused')",
+                (status, time.time(), job_id),
+            )
+
+    def finish(self, job_id, status="done"):
+        # A cancelled job stays cancelled
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, updated = ? WHERE id = ? AND status = 'running'",
+                (status, time.time(), job_id),
+            )
+
+    def cancel(self, job_id):
+        """Cancel a queued, running or paused job; returns False if it had already ended"""
+        with self.lock, self.conn:
+            cur = self.conn.execute(
+                "UPDATE jobs SET status = 'cancelled', updated = ? WHERE id = ? AND status IN ('queued', 'running', 'paused')",
+                (time.time(), job_id),
+            )
+            if cur.rowcount:
+                self.cancelled.add(job_id)
+        return cur.rowcount > 0
+
+    def is_cancelled(self, job_id):
+        return job_id in self.cancelled
+
+    def active_ids(self):
+        """IDs of jobs that are queued, running or paused, in any process"""
+        with self.lock:
+            rows = self.conn.execute("SELECT id FROM jobs WHERE status IN ('queued', 'running', 'paused')").fetchall()
+        return [row["id"] for row in rows]
+
+    def queue_position(self, job):
+        """How many jobs of the same owner run before this queued one"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE owner = ? AND status IN ('running', 'paused', 'queued') AND id < ?",
+                (job["owner"], job["id"]),
+            ).fetchone()[0]
+
+    def alert(self, message):
+        """Leave a message for the Telegram bot to deliver, from any process"""
+        with self.lock, self.conn:
+            self.conn.execute("INSERT INTO alerts (created, message) VALUES (?, ?)", (time.time(), message))
+
+    def undelivered_alerts(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM alerts WHERE delivered = 0 ORDER BY id").fetchall()
+        return [dict(row) for row in rows]
+
+    def mark_delivered(self, alert_ids):
+        with self.lock, self.conn:
+            self.conn.executemany("UPDATE alerts SET delivered = 1 WHERE id = ?", [(i,) for i in alert_ids])
+
+    def add_alert_chat(self, chat_id):
+        """Remember a chat that receives alerts, so it still does after a restart"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO alert_chats (chat_id, added) VALUES (?, ?)", (chat_id, time.time())
+            )
+
+    def alert_chats(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT chat_id FROM alert_chats ORDER BY added")]
+
+    def recent(self, limit=10):
+        """Latest jobs of every owner, newest first"""
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+
+class CrawlQueue:
+    """Runs one owner's queued jobs one at a time on a background thread"""
+
+    def __init__(self, jobs, owner, run_job, poll_seconds=5.0):
+        self.jobs = jobs
+        self.owner = owner
+        self.run_job = run_job  # Called with the claimed job dict
+        self.poll_seconds = poll_seconds
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def submit(self, start_id, end_id, strategy="linear"):
+        job = self.jobs.enqueue(start_id, end_id, self.owner, strategy)
+        self.wakeup.set()
+        return job
+
+    def _run(self):
+        while True:
+            job = self.jobs.claim_next(self.owner)
+            if job is None:
+                self.wakeup.wait(self.poll_seconds)
+                self.wakeup.clear()
+                continue
+            try:
+                self.run_job(job)
+            except Exception as e:
+                # Paused rather than failed, so it is resumed from its last checkpoint (or can be cancelled)
+                logger.error(f"Crawl job {job['id']} interrupted: {e}")
+                self.jobs.set_status(job["id"], "paused")
+                self.wakeup.wait(self.poll_seconds)
+                self.wakeup.clear()
+
+
+class CrawlCursor:
+    """
+    Tracks the last committed ID of a crawl. With concurrent probes and queued parses IDs
+    finish out of order, so the committed position is just below the oldest unfinished ID.
+    """
+
+    def __init__(self, start_id, checkpoint_seconds=5.0):
+        self.start_id = start_id
+        self.checkpoint_seconds = checkpoint_seconds
+        self.lock = threading.Lock()
+        self.advanced = start_id - 1  # Highest ID handed out or skipped
+        self.in_flight = []  # Heap of dispatched IDs, finished ones removed lazily
+        self.pending = set()  # Dispatched, unfinished IDs
+        self.last_checkpoint = time.time()
+
+    def skip(self, doc_id):
+        with self.lock:
+            self.advanced = doc_id
+
+    def start(self, doc_id):
+        with self.lock:
+            self.advanced = doc_id
+            heapq.heappush(self.in_flight, doc_id)
+            self.pending.add(doc_id)
+
+    def retry(self, doc_id):
+        # Retries are out of order, so they do not move the cursor; they only count as in flight
+        with self.lock:
+            self.pending.add(doc_id)
+
+    def finish(self, doc_id):
+        with self.lock:
+            self.pending.discard(doc_id)
+            while self.in_flight and self.in_flight[0] not in self.pending:
+                heapq.heappop(self.in_flight)
+
+    def idle(self):
+        """No dispatched ID (or retry) is still being probed or parsed"""
+        with self.lock:
+            return not self.pending
+
+    def position(self):
+        """Every ID at or below this has been fully handled"""
+        with self.lock:
+            if self.in_flight:
+                return self.in_flight[0] - 1
+            return self.advanced
+
+    def checkpoint_due(self):
+        now = time.time()
+        if now - self.last_checkpoint < self.checkpoint_seconds:
+            return False
+        self.last_checkpoint = now
+        return True
@@ -0,0 +1,289 @@
+"""
+Crawl Pipeline for ETD UGM Crawler
+Two-stage fetch/parse pipeline: crawl threads fetch, a process pool parses PDFs
+"""
+
+import os
+import queue
+import hashlib
+import tempfile
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from crawler_client import document_size
+from crawl_store import content_key
+
+logger = logging.getLogger(__name__)
+
+
+def crawl_concurrently(doc_ids, probe_one, concurrency):
+    """Run probe_one over doc_ids with at most `concurrency` probes in flight"""
+    slots = threading.BoundedSemaphore(concurrency)
+
+    def run(doc_id):
+        try:
+            probe_one(doc_id)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for doc_id in doc_ids:
+            # Do not pull the next ID until a probe slot is free
+            slots.acquire()
+            executor.submit(run, doc_id)
+
+
+def content_fingerprint(response, data, complete, prefix_bytes):
+    """
+    SHA-256 over the first prefix_bytes of a document (the whole file when it is smaller) plus its size.
+    Only the prefix is ever downloaded for most hits, so that is what is hashed; it is not a hash of
+    the file, and only together with an identical size (see content_key) does it identify the same file.
+    """
+    digest = hashlib.sha256()
+    view = memoryview(data)
+    for offset in range(0, min(len(data), prefix_bytes), 64 * 1024):
+        digest.update(view[offset:min(offset + 64 * 1024, prefix_bytes)])
+    return {
+        "prefix_sha256": digest.hexdigest(),
+        "size": document_size(response) or (len(data) if complete else None),
+    }
+
+
+class CrawlPipeline:
+    def __init__(self, client, extract_title, parse_workers=2, priority_workers=1, queue_depth=8,
+                 placeholders=("Unknown Title", "Error Extracting Title"), spill_bytes=64 * 1024 * 1024,
+                 known_title=None, whole_file=False):
+        self.client = client
+        self.extract_title = extract_title  # Must be a module-level function so it can be pickled
+        self.known_title = known_title  # Optional known_title(content_key) -> title already stored for that file
+        self.title_cache = None  # Optional TitleCache consulted before any parse
+        self.parse_workers = parse_workers
+        self.priority_workers = priority_workers  # Separate pool, so lookups neither queue behind the crawl nor hold the GIL
+        self.queue_depth = queue_depth
+        self.placeholders = placeholders
+        self.spill_bytes = spill_bytes
+        self.whole_file = whole_file  # extract_title cannot parse a truncated file, so a prefix is never parsed alone
+
+        self.executor = None
+        self.priority_executor = None
+        self.finisher = None
+        self.slots = threading.BoundedSemaphore(queue_depth)
+        self.results = queue.Queue()
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.in_flight = 0
+        self.counters = {"parsed": 0, "reused": 0, "fallbacks": 0, "backpressure_waits": 0}
+
+    def _pool(self, priority=False):
+        """Start the crawl's (or the interactive lookups') parse pool on first use"""
+        with self.lock:
+            if priority:
+                if self.priority_executor is None:
+                    self.priority_executor = ProcessPoolExecutor(max_workers=self.priority_workers)
+                return self.priority_executor
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.parse_workers)
+            return self.executor
+
+    def extract(self, source, priority=False):
+        """Parse PDF bytes (or a spilled file path) in a pool and wait for the title"""
+        try:
+            title = self._pool(priority).submit(self.extract_title, source).result()
+        except Exception as e:
+            # A broken pool should not lose the document; parse it here instead
+            logger.error(f"Parse worker failed, parsing in-process: {e}")
+            title = self.extract_title(source)
+        with self.lock:
+            self.counters["parsed"] += 1
+        return title
+
+    def _read_prefix(self, r):
+        """Read a hit's prefix; an incomplete stream stays open for _read_rest() or release()"""
+        data, complete = self.client.read_prefix(r)
+        content = content_fingerprint(r, data, complete, self.client.prefix_bytes)
+        return data, complete, self.client.bytes_read(r), content
+
+    def _read_rest(self, r, doc_id, data, transferred, priority=False):
+        """
+        The whole document after its prefix, continuing the stream while it is open.
+        Returns (bytes, or the path of a spilled file, bytes_transferred).
+        """
+        size = document_size(r)
+        if size is not None and size > self.spill_bytes:
+            # Too large to hold in memory, so spill to a private temporary file
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+                extra_bytes = self.client.read_remaining_to(doc_id, r, data, f, priority=priority)
+            return f.name, transferred + extra_bytes
+        data, extra_bytes = self.client.read_remaining(doc_id, r, data, priority=priority)
+        return data, transferred + extra_bytes
+
+    def _discard(self, source):
+        # A spilled file is only needed until it has been parsed
+        if isinstance(source, str):
+            try:
+                os.remove(source)
+            except Exception as e:
+                logger.error(f"Error deleting temporary file: {e}")
+
+    def _extract_whole(self, r, doc_id, data, transferred, priority=False):
+        source, transferred = self._read_rest(r, doc_id, data, transferred, priority)
+        try:
+            return self.extract(source, priority), transferred
+        finally:
+            self._discard(source)
+
+    def _reuse(self, content):
+        """Title cached for these bytes, or of an already stored copy of the file, so it is not parsed again"""
+        key = content_key(content)
+        if key is None:
+            # Size unknown: a matching prefix alone does not make it the same file
+            return None
+        title = None
+        if self.title_cache is not None:
+            title = self.title_cache.get(key)
+        if title is None and self.known_title is not None:
+            title = self.known_title(key)
+        if title is not None:
+            with self.lock:
+                self.counters["reused"] += 1
+        return title
+
+    def _remember(self, content, title):
+        # Placeholders may come from a transient failure, so only real titles are cached
+        key = content_key(content)
+        if self.title_cache is not None and key is not None and title not in self.placeholders:
+            self.title_cache.put(key, title)
+
+    def _complete(self, r, doc_id, data, complete, title, transferred, priority=False):
+        """Fall back to the full file when the prefix could not be parsed"""
+        if title not in self.placeholders or complete:
+            return title, transferred
+
+        with self.lock:
+            self.counters["fallbacks"] += 1
+        return self._extract_whole(r, doc_id, data, transferred, priority)
+
+    def extract_from_response(self, r, doc_id, priority=False):
+        """Fetch and parse one hit synchronously; returns (title, bytes_transferred, content)"""
+        data, complete, transferred, content = self._read_prefix(r)
+        try:
+            title = self._reuse(content)
+            if title is not None:
+                return title, transferred, content
+            if self.whole_file and not complete:
+                title, transferred = self._extract_whole(r, doc_id, data, transferred, priority)
+            else:
+                # The stream is still open, so a fallback carries on reading it rather than downloading again
+                title = self.extract(data, priority)
+                title, transferred = self._complete(r, doc_id, data, complete, title, transferred, priority)
+        finally:
+            if not complete:
+                self.client.release(r)
+        self._remember(content, title)
+        return title, transferred, content
+
+    def submit(self, r, doc_id, on_done, on_error=None):
+        """
+        Read a hit's prefix on the calling (fetch) thread and queue its parse.
+        on_done(title, bytes_transferred, content) runs on the finisher thread, as does
+        on_error(error) when the fallback download or on_done itself fails.
+        Blocks while queue_depth documents are already waiting to be parsed.
+        """
+        data, complete, transferred, content = self._read_prefix(r)
+        title = self._reuse(content)
+        if not complete:
+            try:
+                if title is None and self.whole_file:
+                    # Nothing to parse until the whole file is here, so finish reading the open stream now
+                    data, transferred = self._read_rest(r, doc_id, data, transferred)
+                    complete = True
+            finally:
+                # Do not hold a connection open while the parse waits in the queue
+                self.client.release(r)
+
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.counters["backpressure_waits"] += 1
+            self.slots.acquire()
+
+        with self.lock:
+            self.in_flight += 1
+            if self.finisher is None or not self.finisher.is_alive():
+                self.finisher = threading.Thread(target=self._finish_loop, daemon=True)
+                self.finisher.start()
+
+        job = (r, doc_id, data, complete, transferred, content, on_done, on_error)
+        if title is not None:
+            # Known file: hand the stored title straight to the finisher, no parse
+            self.results.put((title, job))
+            return
+        try:
+            future = self._pool().submit(self.extract_title, data)
+        except Exception as e:
+            logger.error(f"Could not queue parse for {doc_id}: {e}")
+            self.results.put((None, job))
+            return
+        future.add_done_callback(lambda f: self.results.put((f, job)))
+
+    def _finish_loop(self):
+        """Second stage: collect parse results, run fallbacks and hand titles back"""
+        while True:
+            outcome, (r, doc_id, data, complete, transferred, content, on_done, on_error) = self.results.get()
+            try:
+                if isinstance(outcome, str):
+                    title = outcome  # Reused from a stored copy of the same file
+                else:
+                    try:
+                        title = outcome.result() if outcome is not None else self.extract_title(data)
+                    except Exception as e:
+                        logger.error(f"Parse worker failed for {doc_id}: {e}")
+                        title = self.extract_title(data)
+                    with self.lock:
+                        self.counters["parsed"] += 1
+                    title, transferred = self._complete(r, doc_id, data, complete, title, transferred)
+                    self._remember(content, title)
+                on_done(title, transferred, content)
+            except Exception as e:
+                logger.error(f"Error finishing document {doc_id}: {e}")
+                if on_error is not None:
+                    try:
+                        on_error(e)
+                    except Exception as callback_error:
+                        logger.error(f"Error handler failed for document {doc_id}: {callback_error}")
+            finally:
+                self._discard(data)
+                self.slots.release()
+                with self.lock:
+                    self.in_flight -= 1
+                    self.idle.notify_all()
+
+    def is_idle(self):
+        with self.lock:
+            return not self.in_flight
+
+    def join(self):
+        """Wait until every submitted document has been parsed and handed back"""
+        with self.lock:
+            while self.in_flight:
+                self.idle.wait()
+
+    def status(self):
+        with self.lock:
+            return {
+                "workers": self.parse_workers,
+                "priority_workers": self.priority_workers,
+                "queue_depth": self.queue_depth,
+                "in_flight": self.in_flight,
+                **self.counters,
+            }
+
+    def shutdown(self):
+        self.join()
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+            if self.priority_executor is not None:
+                self.priority_executor.shutdown()
+                self.priority_executor = None
@@ -0,0 +1,394 @@
+"""
+Crawl Store for ETD UGM Crawler
+Storage engines for crawled PDF metadata:
+- CrawlStore: SQLite (WAL) with single-row upserts
+- CrawlJournal: JSON snapshot plus fsynced append-only journal with background compaction
+- HashIndex: in-memory (prefix hash, size) -> IDs index for spotting duplicate files
+- IdIndex: in-memory sorted IDs for keyset pagination
+"""
+
+import os
+import json
+import bisect
+import sqlite3
+import threading
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Columns stored directly; any other record keys go into the "extra" JSON column
+RECORD_COLUMNS = ("filename", "title", "date", "direct_url")
+
+
+class CrawlStore:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.version = 0  # Bumped on every commit, so readers can tell when their view is stale
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS pdfs (
+                id INTEGER PRIMARY KEY,
+                filename TEXT,
+                title TEXT,
+                date TEXT,
+                direct_url TEXT,
+                extra TEXT
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self.conn.commit()
+
+    def _row_to_record(self, row):
+        """Convert a pdfs row back into the record dict used by the apps"""
+        record = {"id": row[0]}
+        record.update(zip(RECORD_COLUMNS, row[1:5]))
+        if row[5]:
+            record.update(json.loads(row[5]))
+        return record
+
+    def _record_to_row(self, record):
+        """Split a record dict into column values plus extra JSON"""
+        extra = {k: v for k, v in record.items() if k != "id" and k not in RECORD_COLUMNS}
+        return (
+            int(record["id"]),
+            *(record.get(column) for column in RECORD_COLUMNS),
+            json.dumps(extra, ensure_ascii=False) if extra else None,
+        )
+
+    def upsert(self, record):
+        """Insert or replace a single record in its own transaction"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pdfs (id, filename, title, date, direct_url, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                self._record_to_row(record),
+            )
+            self.version += 1
+
+    def upsert_many(self, records):
+        """Insert or replace many records in one transaction"""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO pdfs (id, filename, title, date, direct_url, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [self._record_to_row(record) for record in records],
+            )
+            self.version += 1
+
+    def get(self, doc_id):
+        """Fetch one record by document ID, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, filename, title, date, direct_url, extra FROM pdfs WHERE id = ?",
+                (int(doc_id),),
+            ).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def load_all(self):
+        """Load every record keyed by string ID, matching the old JSON layout"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, filename, title, date, direct_url, extra FROM pdfs ORDER BY id"
+            ).fetchall()
+        return {str(row[0]): self._row_to_record(row) for row in rows}
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM pdfs").fetchone()[0]
+
+    def get_meta(self, key, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value))
+            )
+
+    def migrate_json(self, json_path):
+        """One-time import of the legacy crawled_pdfs.json file"""
+        if self.get_meta("migrated_from_json") or not os.path.exists(json_path):
+            return 0
+
+        with open(json_path, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
+
+        # Keep anything already in the store; legacy entries only fill gaps
+        with self.lock:
+            existing = {row[0] for row in self.conn.execute("SELECT id FROM pdfs")}
+        records = [record for record in legacy.values() if int(record["id"]) not in existing]
+        self.upsert_many(records)
+        self.set_meta("migrated_from_json", json_path)
+
+        logger.info(f"Migrated {len(records)} entries from {json_path}")
+        return len(records)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def lock_exclusively(f):
+    """Non-blocking exclusive lock on an open file, held until it is closed; OSError if another process holds it"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+class CrawlJournal:
+    """
+    Single-process engine: compaction rotates the journal and snapshots this process's records,
+    so a second process appending to the same files would lose entries. Opening it while another
+    process holds it raises instead; use the SQLite engine to share the store.
+    """
+
+    def __init__(self, snapshot_path, journal_path, compact_bytes=1024 * 1024):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.rotated_path = journal_path + ".compacting"
+        self.compact_bytes = compact_bytes
+        self.owner = open(journal_path + ".lock", 'a')
+        try:
+            lock_exclusively(self.owner)
+        except OSError:
+            self.owner.close()
+            raise RuntimeError(f"{journal_path} is in use by another process; use the sqlite store to share it")
+        self.lock = threading.Lock()
+        self.compacting = threading.Lock()  # One compaction at a time
+        self.compactor = None
+        self.records = {}
+        self.version = 0  # Bumped on every append, like CrawlStore.version
+        self._replay()
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+        if self._has_torn_tail():
+            # Start the next append on a fresh line so it is not glued to the torn one
+            self.journal.write("\n")
+            self.journal.flush()
+
+    def _has_torn_tail(self):
+        if not os.path.getsize(self.journal_path):
+            return False
+        with open(self.journal_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def _replay(self):
+        """Rebuild state from snapshot, then any half-compacted journal, then the live journal"""
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                self.records = json.load(f)
+
+        replayed = 0
+        for path in (self.rotated_path, self.journal_path):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash mid-append
+                        logger.warning(f"Skipping unreadable journal line in {path}")
+                        continue
+                    self.records[str(record["id"])] = record
+                    replayed += 1
+        if replayed:
+            logger.info(f"Replayed {replayed} journal entries")
+
+    def upsert(self, record):
+        """Append one record to the journal and fsync it"""
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            self.journal.write(line)
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            self.records[str(record["id"])] = record
+            self.version += 1
+            if self.journal.tell() >= self.compact_bytes:
+                self._start_compactor()
+
+    def _start_compactor(self):
+        # Called with self.lock held, so two appends cannot both start one
+        if self.compactor is None or not self.compactor.is_alive():
+            self.compactor = threading.Thread(target=self.compact, daemon=True)
+            self.compactor.start()
+
+    def upsert_many(self, records):
+        for record in records:
+            self.upsert(record)
+
+    def get(self, doc_id):
+        with self.lock:
+            return self.records.get(str(doc_id))
+
+    def load_all(self):
+        with self.lock:
+            return dict(self.records)
+
+    def count(self):
+        with self.lock:
+            return len(self.records)
+
+    def compact(self, background=False):
+        """Fold the journal into a fresh snapshot"""
+        if background:
+            with self.lock:
+                self._start_compactor()
+            return
+        with self.compacting:
+            self._compact()
+
+    def _compact(self):
+        # Rotate the journal so new appends keep going while the snapshot is written
+        with self.lock:
+            self.journal.close()
+            if os.path.exists(self.rotated_path):
+                # A previous compaction did not finish; keep its entries until the snapshot lands
+                with open(self.journal_path, 'r', encoding='utf-8') as src, \
+                        open(self.rotated_path, 'a', encoding='utf-8') as dst:
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, self.rotated_path)
+            self.journal = open(self.journal_path, 'a', encoding='utf-8')
+            snapshot = dict(self.records)
+
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        os.remove(self.rotated_path)
+        logger.info(f"Compacted journal into snapshot ({len(snapshot)} entries)")
+
+    def migrate_json(self, json_path):
+        """The legacy JSON file is this engine's snapshot, so nothing to import"""
+        if os.path.abspath(json_path) == os.path.abspath(self.snapshot_path):
+            return 0
+        with open(json_path, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
+        records = [record for key, record in legacy.items() if key not in self.records]
+        self.upsert_many(records)
+        return len(records)
+
+    def close(self):
+        if self.compactor is not None:
+            self.compactor.join()
+        with self.lock:
+            self.journal.close()
+        self.owner.close()
+
+
+def content_key(record):
+    """(prefix_sha256, size) identifying a record's file, or None when either is unknown"""
+    # Records stored before the field was renamed carry the same prefix hash under "sha256"
+    prefix_sha256 = record.get("prefix_sha256") or record.get("sha256")
+    size = record.get("size")
+    if not prefix_sha256 or size is None:
+        return None
+    return prefix_sha256, size
+
+
+class HashIndex:
+    """Content key (prefix hash, size) -> IDs of the records carrying it, kept beside the in-memory records"""
+
+    def __init__(self, records=()):
+        self.lock = threading.Lock()
+        self.ids = {}  # (prefix_sha256, size) -> set of IDs
+        self.keys = {}  # ID -> content key, so a re-hashed record leaves its old group
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        doc_id = int(record["id"])
+        key = content_key(record)
+        with self.lock:
+            old = self.keys.pop(doc_id, None)
+            if old is not None:
+                self.ids[old].discard(doc_id)
+                if not self.ids[old]:
+                    del self.ids[old]
+            if key is not None:
+                self.keys[doc_id] = key
+                self.ids.setdefault(key, set()).add(doc_id)
+
+    def lookup(self, key):
+        """IDs stored with this content key, lowest first"""
+        with self.lock:
+            return sorted(self.ids.get(key, ()))
+
+    def duplicates(self):
+        """Content keys shared by more than one ID, with their IDs"""
+        with self.lock:
+            return {key: sorted(ids) for key, ids in self.ids.items() if len(ids) > 1}
+
+
+class IdIndex:
+    """Stored IDs kept in ascending order, so a page is a bisect and a slice instead of a sort"""
+
+    def __init__(self, ids=()):
+        self.lock = threading.Lock()
+        self.ids = sorted({int(doc_id) for doc_id in ids})
+
+    def add(self, doc_id):
+        doc_id = int(doc_id)
+        with self.lock:
+            # New IDs mostly land at the end, where the insert is an append
+            position = bisect.bisect_left(self.ids, doc_id)
+            if position == len(self.ids) or self.ids[position] != doc_id:
+                self.ids.insert(position, doc_id)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def page(self, after=None, before=None, limit=50):
+        """
+        Up to limit IDs following `after` (or preceding `before`), with the position of the
+        first one and the total count
+        """
+        with self.lock:
+            if before is not None:
+                end = bisect.bisect_left(self.ids, before)
+                start = max(0, end - limit)
+            else:
+                start = bisect.bisect_right(self.ids, after) if after is not None else 0
+                end = start + limit
+            return self.ids[start:end], start, len(self.ids)
+
+
+def open_crawl_store(mode, db_path, json_path, journal_path, compact_bytes=1024 * 1024):
+    """Open the configured storage engine ("sqlite" or "journal")"""
+    if mode == "journal":
+        return CrawlJournal(json_path, journal_path, compact_bytes)
+    return CrawlStore(db_path)
+
+
+if __name__ == '__main__':
+    import sys
+
+    json_path = sys.argv[1] if len(sys.argv) > 1 else "crawled_pdfs.json"
+    db_path = sys.argv[2] if len(sys.argv) > 2 else "crawled_pdfs.db"
+
+    store = CrawlStore(db_path)
+    migrated = store.migrate_json(json_path)
+    print(f"Migrated {migrated} entries from {json_path} into {db_path}")
+    print(f"Store now holds {store.count()} entries")
+    store.close()
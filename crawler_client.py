@@ -0,0 +1,328 @@
+"""
+Crawler Client for ETD UGM Crawler
+Shared keep-alive HTTP session used by the web app, the CLI crawler and the Telegram bot
+"""
+
+import time
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Substrings of a redirect target that mean "log in first"
+LOGIN_MARKERS = ("login", "signin", "sso", "/auth")
+
+
+class CountingAdapter(HTTPAdapter):
+    """HTTPAdapter that counts real TCP connects, including silent reconnects of pooled sockets"""
+
+    def __init__(self, *args, **kwargs):
+        self.connects = 0
+        self.connect_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def _count_connect(self):
+        with self.connect_lock:
+            self.connects += 1
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        adapter = self
+
+        class CountingHTTPConnection(HTTPConnection):
+            def connect(self):
+                adapter._count_connect()
+                super().connect()
+
+        class CountingHTTPSConnection(HTTPSConnection):
+            def connect(self):
+                adapter._count_connect()
+                super().connect()
+
+        class CountingHTTPConnectionPool(HTTPConnectionPool):
+            ConnectionCls = CountingHTTPConnection
+
+        class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+            ConnectionCls = CountingHTTPSConnection
+
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
+
+
+def attachment_filename(response):
+    """Filename from the Content-Disposition header, or None when the response is not a PDF attachment"""
+    disposition = response.headers.get('Content-Disposition', '')
+    if 'attachment; filename=' not in disposition:
+        return None
+    return disposition.split('filename=')[1].strip('"')
+
+
+def is_login_redirect(response):
+    """True when the server answered with (or redirected to) a login page, i.e. the session has expired"""
+    if response.status_code == 401:
+        return True
+    locations = [response.headers.get('Location', '')] if response.is_redirect else []
+    if response.history:
+        locations.append(response.url)
+    return any(marker in location.lower() for location in locations for marker in LOGIN_MARKERS)
+
+
+def document_size(response):
+    """Full size of the document behind a response, from Content-Range or Content-Length"""
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get('Content-Length', '')
+    return int(length) if length.isdigit() else None
+
+
+def document_validators(response):
+    """What identifies this version of a document: ETag, Last-Modified and full size, where the server sends them"""
+    return {
+        "etag": response.headers.get('ETag'),
+        "last_modified": response.headers.get('Last-Modified'),
+        "size": document_size(response) if response.status_code in (200, 206) else None,
+    }
+
+
+class CrawlerClient:
+    def __init__(self, base_url, session_cookie, timeout=(5, 10), retries=2, pool_size=4,
+                 drain_limit=8192, prefix_bytes=256 * 1024):
+        self.base_url = base_url
+        self.timeout = timeout  # (connect, read) seconds, applied to every request
+        self.drain_limit = drain_limit  # Bodies up to this size are read so the socket can be reused
+        self.prefix_bytes = prefix_bytes  # How much of a PDF to read before trying to parse it
+        self.supports_ranges = False  # Learned from the first attachment that advertises Accept-Ranges
+        self.budget = None  # Optional shared RateBudget; every request waits for a token
+        self.rate_controller = None  # Optional AdaptiveRateController fed with every outcome
+        self.breaker = None  # Optional SessionBreaker fed with every probe
+        self.session_cookie = session_cookie
+        self.lock = threading.Lock()
+        self.requests_made = 0
+        self.redownloaded_bytes = 0  # Prefix bytes fetched a second time by servers that ignore Range
+
+        self.session = requests.Session()
+        self.session.headers["Cookie"] = f"ugmfw_session={session_cookie}"
+
+        # Retry only failed connects, which never reached the server. A resent request would bypass
+        # the rate budget, so gateway errors and read failures go back to the RetryQueue instead.
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=0,
+            backoff_factor=0.5,
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            raise_on_status=False,
+        )
+        self.adapter = CountingAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    def set_session_cookie(self, session_cookie):
+        self.session_cookie = session_cookie
+        self.session.headers["Cookie"] = f"ugmfw_session={session_cookie}"
+
+    def url_for(self, doc_id):
+        return f"{self.base_url}{doc_id}"
+
+    def get(self, doc_id, stream=False, headers=None, priority=False):
+        """GET a document URL over the pooled session; priority (interactive) requests skip ahead of crawling"""
+        if self.budget is not None:
+            self.budget.acquire(priority=priority)
+        with self.lock:
+            self.requests_made += 1
+
+        start = time.time()
+        try:
+            r = self.session.get(self.url_for(doc_id), timeout=self.timeout, stream=stream, headers=headers)
+        except requests.RequestException as e:
+            if self.rate_controller is not None:
+                self.rate_controller.record(error=e)
+            raise
+        if self.rate_controller is not None:
+            self.rate_controller.record(latency=time.time() - start, status_code=r.status_code)
+        return r
+
+    def probe(self, doc_id, priority=False, headers=None):
+        """
+        Stream a document and decide from the headers alone.
+        Returns (response, filename). When there is no attachment,
+        the response is released before any of the body is downloaded.
+        Extra headers (e.g. If-None-Match) are sent as given; a 304 counts as no attachment.
+        """
+        # Once the server is known to honour ranges, ask for just the prefix up front
+        headers = dict(headers or {})
+        if self.supports_ranges:
+            headers["Range"] = f"bytes=0-{self.prefix_bytes - 1}"
+
+        r = self.get(doc_id, stream=True, headers=headers or None, priority=priority)
+        filename = attachment_filename(r)
+        if self.breaker is not None:
+            self.breaker.record(filename is None and is_login_redirect(r))
+        if filename is not None and (r.status_code == 206 or r.headers.get('Accept-Ranges') == 'bytes'):
+            self.supports_ranges = True
+        if filename is None:
+            self.release(r)
+        return r, filename
+
+    def read_prefix(self, response):
+        """
+        Read at most prefix_bytes of a streamed body.
+        Returns (data, complete) where complete means the whole document has been read.
+        An incomplete response stays open for read_remaining() or release().
+        """
+        data = response.raw.read(self.prefix_bytes, decode_content=True) or b""
+        total = document_size(response)
+        if response.status_code != 206 and total is not None and 0 < total - len(data) <= self.drain_limit:
+            # Only a small tail is left, so take the whole file now
+            data += response.raw.read(decode_content=True) or b""
+        complete = len(data) < self.prefix_bytes or (total is not None and len(data) >= total)
+        if complete or response.status_code == 206:
+            self.release(response)
+        return data, complete
+
+    def read_remaining(self, doc_id, response, data, priority=False):
+        """
+        Finish downloading a document whose prefix was not enough to parse.
+        Returns (data, extra_bytes) where extra_bytes is what the rest of the document added.
+        """
+        if response.status_code != 206 and not response.raw.closed:
+            before = response.raw.tell()
+            rest = response.raw.read(decode_content=True) or b""
+            return data + rest, response.raw.tell() - before
+
+        # The original stream is gone, so ask for the missing tail (servers without ranges send it all)
+        r = self.get(doc_id, headers={"Range": f"bytes={len(data)}-"}, priority=priority)
+        if r.status_code == 206:
+            return data + r.content, len(r.content)
+        return r.content, self._redownloaded(len(r.content), len(data))
+
+    def read_remaining_to(self, doc_id, response, data, out, chunk_size=64 * 1024, priority=False):
+        """
+        Like read_remaining(), but stream the whole document into a file object instead of memory.
+        Returns extra_bytes fetched by a second request.
+        """
+        out.write(data)
+        if response.status_code != 206 and not response.raw.closed:
+            before = response.raw.tell()
+            while True:
+                chunk = response.raw.read(chunk_size, decode_content=True)
+                if not chunk:
+                    return response.raw.tell() - before
+                out.write(chunk)
+
+        r = self.get(doc_id, stream=True, headers={"Range": f"bytes={len(data)}-"}, priority=priority)
+        if r.status_code != 206:
+            # Range was ignored; start the file over from the full body
+            out.seek(0)
+            out.truncate()
+        for chunk in r.iter_content(chunk_size):
+            out.write(chunk)
+        if r.status_code != 206:
+            return self._redownloaded(r.raw.tell(), len(data))
+        return r.raw.tell()
+
+    def _redownloaded(self, received, held):
+        """
+        A Range-less server sent the whole file again: only the part not already held is extra for
+        the document, the repeated prefix is counted apart as waste
+        """
+        with self.lock:
+            self.redownloaded_bytes += min(received, held)
+        return max(received - held, 0)
+
+    def bytes_read(self, response):
+        """Body bytes actually pulled off the wire for a streamed response"""
+        return response.raw.tell()
+
+    def release(self, response):
+        """Give a streamed response back without downloading a large body"""
+        length = response.headers.get('Content-Length', '')
+        if length.isdigit() and int(length) - response.raw.tell() <= self.drain_limit:
+            # Small leftovers are cheaper to drain than to reconnect for
+            response.raw.read(decode_content=True)
+            return
+        response.close()
+
+    def stats(self):
+        """Connection reuse counters for the shared session"""
+        pool_requests = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            try:
+                pool_requests += pools[key].num_requests
+            except KeyError:
+                continue
+
+        connections = self.adapter.connects
+        reused = max(pool_requests - connections, 0)
+        return {
+            "requests": self.requests_made,
+            "connections_opened": connections,
+            "connections_reused": reused,
+            "reuse_ratio": reused / pool_requests if pool_requests else 0.0,
+            "redownloaded_bytes": self.redownloaded_bytes,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+class SessionBreaker:
+    """
+    Circuit breaker for an expired session cookie: trips after `threshold` consecutive
+    login redirects and stays open until a different cookie is supplied
+    """
+
+    def __init__(self, client, threshold=5, on_trip=None):
+        self.client = client
+        self.threshold = threshold
+        self.on_trip = on_trip  # Called once per trip, from the probing thread
+        self.lock = threading.Lock()
+
+        # Live view for status pages; mutated in place
+        self.state = {
+            "tripped": False,
+            "consecutive": 0,
+            "trips": 0,
+            "tripped_at": None,
+        }
+
+    @property
+    def tripped(self):
+        return self.state["tripped"]
+
+    def record(self, auth_failed):
+        with self.lock:
+            if not auth_failed:
+                self.state["consecutive"] = 0
+                return
+            self.state["consecutive"] += 1
+            if self.state["tripped"] or self.state["consecutive"] < self.threshold:
+                return
+            self.state["tripped"] = True
+            self.state["trips"] += 1
+            self.state["tripped_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        logger.warning(f"Session breaker tripped after {self.threshold} consecutive login redirects")
+        if self.on_trip is not None:
+            self.on_trip()
+
+    def try_reset(self, session_cookie):
+        """Close the breaker if session_cookie is new; returns True when it was reset"""
+        with self.lock:
+            if not self.state["tripped"] or not session_cookie or session_cookie == self.client.session_cookie:
+                return False
+            self.client.set_session_cookie(session_cookie)
+            self.state["tripped"] = False
+            self.state["consecutive"] = 0
+        logger.info("Session cookie updated, breaker reset")
+        return True
@@ -0,0 +1,58 @@
+"""
+Document Lookup for ETD UGM Crawler
+Helpers for cache-first single-ID lookups in the web app and the bot: fresh stored records
+are answered without a request, and concurrent lookups of one ID share a single upstream fetch
+"""
+
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def is_fresh(record, max_age_days, now=None):
+    """Whether a stored record was crawled or re-validated within max_age_days"""
+    checked = record.get("checked") or record.get("date")
+    if not checked:
+        return False
+    try:
+        checked_at = time.mktime(time.strptime(checked, "%Y-%m-%d %H:%M:%S"))
+    except ValueError:
+        return False
+    return (now or time.time()) - checked_at < max_age_days * 86400
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; callers arriving meanwhile wait for and share its result"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}  # key -> [done event, result, error]
+        self.shared = 0  # Callers served by another caller's fetch
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = [threading.Event(), None, None]
+            else:
+                self.shared += 1
+
+        if not leader:
+            call[0].wait()
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+
+        try:
+            call[1] = fn()
+            return call[1]
+        except Exception as e:
+            call[2] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call[0].set()
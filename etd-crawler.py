@@ -1,49 +1,205 @@
-from flask import Flask, request, render_template_string, send_file, redirect, url_for
-import requests
+from flask import Flask, Response, request, render_template, send_file, redirect, url_for
+from jinja2 import DictLoader
+import io
+import csv
 import os
 import fitz  # PyMuPDF for PDF parsing
-import threading
 import time
 import re
 from datetime import datetime
-import json
+import functools
 import urllib.parse
+from crawl_store import open_crawl_store, HashIndex, IdIndex
+from crawler_client import CrawlerClient, SessionBreaker, document_validators, is_login_redirect
+from crawl_pipeline import CrawlPipeline, crawl_concurrently
+from rate_budget import RateBudget, AdaptiveRateController
+from probe_state import ProbeMap, status_for_response, ERROR, FOUND
+from crawl_jobs import CrawlJobs, CrawlCursor, CrawlQueue
+from id_scheduler import DensityScheduler, Follower
+from retry_queue import RetryQueue, is_transient
+from title_cache import TitleCache
+from document_lookup import SingleFlight, is_fresh
+from search_index import BM25Index, TrigramIndex
+from response_cache import ResponseCache
+from refresh_scheduler import RefreshScheduler, conditional_headers, document_changed, UNCHANGED, CHANGED, GONE, FAILED
 
 app = Flask(__name__)
 BASE_URL = "http://etd.intranet.lib.ugm/home/detail_pencarian_downloadfiles/"
 SESSION_COOKIE = "98bd8iuo8b0ifo9vsneg5b30cd3gtgjv"  # Change if needed
 
 # Database to store crawled PDFs
-CRAWL_DB_FILE = "crawled_pdfs.json"
+CRAWL_DB_FILE = "crawled_pdfs.json"  # Legacy file, migrated once into the store
+CRAWL_STORE_FILE = "crawled_pdfs.db"
+CRAWL_STORE_MODE = "sqlite"  # "sqlite" or "journal" (JSON snapshot + append-only journal)
+CRAWL_JOURNAL_FILE = "crawled_pdfs.journal.jsonl"
+PROBE_STATE_FILE = "probe_state.db"  # Shared by every process
+LEGACY_PROBE_STATE_FILE = "probe_state.json"  # Legacy file, migrated once into PROBE_STATE_FILE
+PROBE_MISS_TTL_DAYS = 30  # Re-check IDs that had no attachment after this many days
+crawl_store = None
+probe_map = None
+TITLE_PREFIX_BYTES = 256 * 1024  # Titles are parsed from this much of each PDF before a full download
+TITLE_PLACEHOLDERS = ("Unknown Title", "Error Extracting Title")
+PDF_SPILL_BYTES = 64 * 1024 * 1024  # Full downloads larger than this are parsed from a temp file
+PARSE_WORKERS = 2  # Processes running extract_pdf_title
+PRIORITY_PARSE_WORKERS = 1  # Processes parsing for interactive lookups, apart from the crawl
+PARSE_QUEUE_DEPTH = 8  # Hits waiting to be parsed before fetching pauses (backpressure)
+TITLE_CACHE_FILE = "title_cache.db"  # Titles by prefix hash and size, shared by every process
+TITLE_CACHE_MAX_ENTRIES = 100000
+TITLE_EXTRACTOR_VERSION = "pymupdf-1"  # Bump when extract_pdf_title changes; titles cached by older versions are ignored
+CRAWL_CONCURRENCY = 3  # Probes in flight at once; they still share the rate budget below
+REQUESTS_PER_SECOND = 1.0  # Starting rate shared by the web app, the CLI crawler and the bot
+MAX_REQUESTS_PER_SECOND = 3.0  # The adaptive controller never goes above this
+MIN_REQUESTS_PER_SECOND = 0.1
+RATE_BUDGET_FILE = "crawl_budget.db"
+CRAWL_JOBS_FILE = "crawl_jobs.db"
+CRAWL_JOB_OWNER = "etd-crawler"  # Each script resumes only the jobs it started
+CHECKPOINT_SECONDS = 5  # How often a running crawl commits its cursor
+DENSITY_BLOCK_SIZE = 1000  # Density crawls estimate hits per block of this many IDs
+DENSITY_SAMPLES_PER_BLOCK = 16  # Probes spent on each block before blocks are ranked
+MIN_BLOCK_DENSITY = 0.0  # Raise to skip blocks whose estimated hit rate is below this
+scheduler = None
+FOLLOW_START_ID = 1000000  # Follow mode starts discovery here when nothing has been found yet
+FOLLOW_LOOKAHEAD = 50  # IDs past the high-water mark checked on every sweep
+FOLLOW_SECONDS_PER_PROBE = 5  # Fixed, low probe rate while following
+FOLLOW_IDLE_SECONDS = 300  # Pause after a sweep that found nothing new
+follower = None
+RETRY_MAX_ATTEMPTS = 5  # Transient failures are tried this many times before they are dead-lettered
+RETRY_BASE_DELAY = 2  # Seconds before the first retry; doubles per attempt, with jitter
+RETRY_MAX_DELAY = 300
+retry_queue = None
+SESSION_COOKIE_FILE = "session_cookie.txt"  # Overrides SESSION_COOKIE when present; every process re-reads it
+AUTH_FAILURE_THRESHOLD = 5  # Consecutive login redirects before crawling pauses for a new cookie
+SESSION_POLL_SECONDS = 10  # How often a paused crawl looks for a renewed cookie
+REFRESH_MAX_AGE_DAYS = 30  # Stored documents are re-validated once their last check is this old
+REFRESH_SECONDS_PER_CHECK = 5  # Fixed, low rate of conditional requests while refreshing
+REFRESH_IDLE_SECONDS = 3600  # Pause once every stored document is fresh
+refresher = None
+LOOKUP_MAX_AGE_DAYS = 30  # ID lookups answer from the store when the record was checked this recently
+lookups = SingleFlight()  # Concurrent lookups of one ID share a single upstream fetch
+DATABASE_PAGE_SIZE = 50  # Rows per database page unless ?limit= asks otherwise
+DATABASE_PAGE_SIZES = (25, 50, 100, 200)
+DATABASE_MAX_PAGE_SIZE = 500
+FUZZY_MATCH_LIMIT = 1000  # Best substring / typo-tolerant matches a search pages through (and exports)
+EXPORT_CHUNK_SIZE = 1000  # Rows rendered per chunk of a streamed CSV export
+EXPORT_COLUMNS = ("id", "title", "date", "filename", "direct_url", "size", "prefix_sha256")
+RESPONSE_CACHE_ENTRIES = 256  # Rendered database pages kept, least recently used evicted first
+RESPONSE_CACHE_BYTES = 32 * 1024 * 1024
+response_cache = ResponseCache(max_entries=RESPONSE_CACHE_ENTRIES, max_bytes=RESPONSE_CACHE_BYTES)
+crawl_jobs = None
+crawl_queue = None
+client = CrawlerClient(BASE_URL, SESSION_COOKIE, prefix_bytes=TITLE_PREFIX_BYTES, pool_size=CRAWL_CONCURRENCY + 1)
 crawled_pdfs = {}
+hash_index = HashIndex()  # (Prefix hash, size) -> IDs, for spotting the same file under several IDs
+id_index = IdIndex()  # Stored IDs in ascending order, for keyset pagination
+search_index = BM25Index()  # Title words -> IDs, for ranked database search
+title_index = TrigramIndex()  # Title word trigrams -> words -> IDs, for substring and typo-tolerant search
 crawl_status = {
     "is_running": False,
     "current_id": 0,
     "total_found": 0,
     "start_time": 0,
-    "end_id": 0
+    "end_id": 0,
+    "job_id": None,
+    "rate_control": {}  # Live view of the adaptive rate controller
 }
 
 def load_crawl_database():
-    global crawled_pdfs
-    if os.path.exists(CRAWL_DB_FILE):
-        try:
-            with open(CRAWL_DB_FILE, 'r', encoding='utf-8') as f:
-                crawled_pdfs = json.load(f)
-            print(f"Loaded {len(crawled_pdfs)} entries from database")
-        except Exception as e:
-            print(f"Error loading database: {e}")
-            crawled_pdfs = {}
-    else:
-        crawled_pdfs = {}
+    global crawled_pdfs, crawl_store, probe_map, crawl_jobs, crawl_queue, scheduler, follower, retry_queue, refresher, hash_index, id_index, search_index, title_index
+    probe_map = ProbeMap(PROBE_STATE_FILE, miss_ttl_days=PROBE_MISS_TTL_DAYS, legacy_path=LEGACY_PROBE_STATE_FILE)
+    scheduler = DensityScheduler(probe_map, block_size=DENSITY_BLOCK_SIZE,
+                                 samples_per_block=DENSITY_SAMPLES_PER_BLOCK, min_density=MIN_BLOCK_DENSITY)
+    follower = Follower(follow_probe, probe_map, FOLLOW_START_ID, lookahead=FOLLOW_LOOKAHEAD,
+                        seconds_per_probe=FOLLOW_SECONDS_PER_PROBE, idle_seconds=FOLLOW_IDLE_SECONDS)
+    crawl_jobs = CrawlJobs(CRAWL_JOBS_FILE)
+    crawl_queue = CrawlQueue(crawl_jobs, CRAWL_JOB_OWNER, run_crawl_job)
+    retry_queue = RetryQueue(CRAWL_JOBS_FILE, max_attempts=RETRY_MAX_ATTEMPTS,
+                             base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY)
+    pipeline.title_cache = TitleCache(TITLE_CACHE_FILE, TITLE_EXTRACTOR_VERSION, max_entries=TITLE_CACHE_MAX_ENTRIES)
+    client.set_session_cookie(current_session_cookie())
+    client.breaker = SessionBreaker(client, threshold=AUTH_FAILURE_THRESHOLD, on_trip=session_expired)
+    client.budget = RateBudget(RATE_BUDGET_FILE, rate=REQUESTS_PER_SECOND)
+    client.rate_controller = AdaptiveRateController(client.budget, ceiling=MAX_REQUESTS_PER_SECOND,
+                                                    floor=MIN_REQUESTS_PER_SECOND)
+    crawl_status["rate_control"] = client.rate_controller.state
+    try:
+        crawl_store = open_crawl_store(CRAWL_STORE_MODE, CRAWL_STORE_FILE, CRAWL_DB_FILE, CRAWL_JOURNAL_FILE)
+        crawl_store.migrate_json(CRAWL_DB_FILE)
+        crawled_pdfs = crawl_store.load_all()
+        hash_index = HashIndex(crawled_pdfs.values())
+        id_index = IdIndex(crawled_pdfs)
+        search_index = BM25Index(crawled_pdfs.values())
+        title_index = TrigramIndex(crawled_pdfs.values())
+        print(f"Loaded {len(crawled_pdfs)} entries from database")
+        seed_probe_state()
+    except Exception as e:
+        # Serving and crawling without the store would lose every hit, so refuse to start
+        raise SystemExit(f"Error loading database: {e}")
+    refresher = RefreshScheduler(refresh_document, crawled_pdfs, max_age_days=REFRESH_MAX_AGE_DAYS,
+                                 seconds_per_check=REFRESH_SECONDS_PER_CHECK, idle_seconds=REFRESH_IDLE_SECONDS)
+
+def current_session_cookie():
+    # The cookie file, when present, overrides SESSION_COOKIE so a session can be renewed without a restart
+    try:
+        with open(SESSION_COOKIE_FILE, 'r', encoding='utf-8') as f:
+            return f.read().strip() or SESSION_COOKIE
+    except FileNotFoundError:
+        return SESSION_COOKIE
+
+def update_session_cookie(session_cookie):
+    # Save a renewed cookie for every process and close this process's breaker
+    session_cookie = session_cookie.strip()
+    with open(SESSION_COOKIE_FILE, 'w', encoding='utf-8') as f:
+        f.write(session_cookie)
+    if not client.breaker.try_reset(session_cookie):
+        client.set_session_cookie(session_cookie)
 
-def save_crawl_database():
-    with open(CRAWL_DB_FILE, 'w', encoding='utf-8') as f:
-        json.dump(crawled_pdfs, f, ensure_ascii=False, indent=2)
+def session_expired():
+    # Breaker callback: alert through the bot (which may be another process); the crawl pauses itself
+    print("Session cookie expired; crawling paused until it is updated")
+    crawl_jobs.alert(f"🔐 Sesi ETD kedaluwarsa ({CRAWL_JOB_OWNER}). Crawling dijeda sampai cookie diperbarui dengan /cookie [nilai] atau di {SESSION_COOKIE_FILE}.")
 
-def extract_pdf_title(pdf_path):
+def wait_for_session(should_stop=lambda: False):
+    # Block while the breaker is open, picking up a renewed cookie from the cookie file
+    while client.breaker.tripped and not should_stop():
+        time.sleep(SESSION_POLL_SECONDS)
+        client.breaker.try_reset(current_session_cookie())
+
+def seed_probe_state():
+    # Records stored before probe state existed (e.g. the JSON migration) count as found,
+    # so the crawl skip check can rely on the probe state alone
+    unseeded = [int(key) for key in crawled_pdfs if key.isdigit() and probe_map.lookup(int(key))[0] != FOUND]
+    for doc_id in unseeded:
+        probe_map.mark(doc_id, FOUND)
+    if unseeded:
+        probe_map.save()
+        print(f"Marked {len(unseeded)} stored documents as found in the probe state")
+
+def store_version():
+    # Cached pages are keyed by this, so every commit retires them; None (no store) bypasses the cache.
+    # Records picked up from another process's commits (search_pdf_by_id) only change the count.
+    return (crawl_store.version, len(crawled_pdfs)) if crawl_store is not None else None
+
+def index_record(record):
+    """Hold a record in memory and in every in-memory index"""
+    crawled_pdfs[str(record["id"])] = record
+    hash_index.add(record)
+    id_index.add(record["id"])
+    search_index.add(record)
+    title_index.add(record)
+
+def save_crawl_database(record):
+    # Single-row upsert (or one journal append); cost does not grow with the database
+    index_record(record)
+    if crawl_store is not None:
+        crawl_store.upsert(record)
+
+def extract_pdf_title(pdf_source):
+    """Extract a title from PDF bytes or a buffer (parsed in memory) or a file path"""
     try:
-        doc = fitz.open(pdf_path)
+        if isinstance(pdf_source, (str, os.PathLike)):
+            doc = fitz.open(pdf_source)
+        else:
+            doc = fitz.open(stream=pdf_source, filetype="pdf")
         first_page = doc.load_page(0)
         
         # Try getting text in blocks which might preserve formatting better
@@ -79,145 +235,289 @@ def extract_pdf_title(pdf_path):
         print(f"Error extracting title: {e}")
         return "Error Extracting Title"
 
-def crawl_pdfs(start_id, end_id):
+def known_title(key):
+    """Title already extracted from the same file (same prefix hash and size) under another ID, or None"""
+    for doc_id in hash_index.lookup(key):
+        title = crawled_pdfs.get(str(doc_id), {}).get("title")
+        if title and title not in TITLE_PLACEHOLDERS:
+            return title
+    return None
+
+# Fetch/parse pipeline: the crawl thread fetches, a process pool runs extract_pdf_title
+pipeline = CrawlPipeline(client, extract_pdf_title, parse_workers=PARSE_WORKERS, priority_workers=PRIORITY_PARSE_WORKERS,
+                         queue_depth=PARSE_QUEUE_DEPTH, placeholders=TITLE_PLACEHOLDERS,
+                         spill_bytes=PDF_SPILL_BYTES, known_title=known_title)
+
+def store_found_document(doc_id, filename, title, bytes_transferred, content=None, cursor=None, validators=None):
+    """Store a parsed hit; runs on the pipeline's finisher thread"""
+    save_crawl_database({
+        "id": doc_id,
+        "filename": filename,
+        "title": title,
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "direct_url": client.url_for(doc_id),
+        "bytes_transferred": bytes_transferred,
+        **(validators or {}),
+        **(content or {})
+    })
+    
+    # Mark after the record is stored so a crash never hides a hit
+    probe_map.mark(doc_id, FOUND)
+    crawl_status["total_found"] += 1
+    if cursor is not None:
+        cursor.finish(doc_id)
+    
+    print(f"Found document {doc_id}: {title} (metadata only)")
+
+def follow_probe(doc_id):
+    """Probe one ID for follow mode; a hit is parsed and stored right away"""
+    try:
+        wait_for_session(follower.stop_event.is_set)
+        # Misses are re-probed here regardless of their TTL, since new uploads fill them in
+        r, filename = client.probe(doc_id)
+        if filename is None:
+            probe_map.mark(doc_id, status_for_response(r.status_code, False, is_login_redirect(r)))
+            return False
+        title, bytes_transferred, content = pipeline.extract_from_response(r, doc_id)
+        save_crawl_database({
+            "id": doc_id,
+            "filename": filename,
+            "title": title,
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "direct_url": client.url_for(doc_id),
+            "bytes_transferred": bytes_transferred,
+            **document_validators(r),
+            **content
+        })
+        probe_map.mark(doc_id, FOUND)
+        print(f"New upload {doc_id}: {title}")
+        return True
+    except Exception as e:
+        probe_map.mark(doc_id, ERROR)
+        print(f"Error following document {doc_id}: {e}")
+        return False
+
+def refresh_document(doc_id, priority=False):
+    """Re-validate one stored document with a conditional request; the title is only extracted again if the file changed"""
+    record = crawled_pdfs.get(str(doc_id))
+    if record is None:
+        return GONE
+    try:
+        if not priority:
+            # Interactive lookups report an expired session instead of waiting for a new cookie
+            wait_for_session(refresher.stop_event.is_set)
+        r, filename = client.probe(doc_id, headers=conditional_headers(record), priority=priority)
+        checked = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if r.status_code == 304:
+            save_crawl_database(dict(record, checked=checked))
+            return UNCHANGED
+        if filename is None:
+            if is_login_redirect(r) or is_transient(status_code=r.status_code):
+                return FAILED
+            # Keep the record; only note that the attachment was missing at this check
+            save_crawl_database(dict(record, checked=checked))
+            print(f"Stored document {doc_id} no longer has an attachment")
+            return GONE
+        
+        validators = document_validators(r)
+        if not document_changed(record, validators) and filename == record.get("filename"):
+            # Same file (or the first check of a record stored without validators): keep its title
+            client.release(r)
+            save_crawl_database(dict(record, checked=checked, **validators))
+            return UNCHANGED
+        
+        title, bytes_transferred, content = pipeline.extract_from_response(r, doc_id, priority=priority)
+        save_crawl_database({**record, **validators, **content, "filename": filename, "title": title,
+                             "checked": checked, "bytes_transferred": bytes_transferred})
+        print(f"Document {doc_id} changed, new title: {title}")
+        return CHANGED
+    except Exception as e:
+        print(f"Error refreshing document {doc_id}: {e}")
+        return FAILED
+
+def crawl_pdfs(start_id, end_id, job=None):
     global crawl_status
     
+    # A new crawl is persisted as a job; a resumed one continues after its last committed ID
+    if job is None:
+        job = crawl_jobs.create(start_id, end_id, CRAWL_JOB_OWNER)
+    # Density and retry jobs visit IDs out of order, so they always restart from the top of
+    # their range and rely on the probe state and retry table to skip what was already done
+    linear = job["strategy"] == "linear"
+    cursor = CrawlCursor(job["cursor"] + 1 if linear else job["start_id"], checkpoint_seconds=CHECKPOINT_SECONDS)
+    requests_before = client.requests_made
+    found_before = job["found"]
+    
+    # Retries that no live job owns (replayed, or left by a job that failed or was cancelled) are this job's
+    retry_queue.adopt(job["id"], crawl_jobs.active_ids())
+    
     crawl_status["is_running"] = True
-    crawl_status["current_id"] = start_id
-    crawl_status["total_found"] = 0
+    crawl_status["current_id"] = cursor.start_id
+    crawl_status["total_found"] = job["found"]
     crawl_status["start_time"] = time.time()
     crawl_status["end_id"] = end_id
+    crawl_status["job_id"] = job["id"]
     
-    # Create temporary directory for downloads
-    temp_dir = os.path.join("temp_downloads")
-    os.makedirs(temp_dir, exist_ok=True)
+    def checkpoint():
+        # Probe state first, so every ID up to the committed cursor is on disk before the cursor is
+        probe_map.save()
+        position = cursor.position() if linear else job["start_id"] - 1
+        return crawl_jobs.checkpoint(job["id"], position, crawl_status["total_found"])
     
-    headers = {'Cookie': f'ugmfw_session={SESSION_COOKIE}'}
+    def pause_while_expired():
+        # Hold the job while the session breaker is open; False if it was cancelled meanwhile
+        if not client.breaker.tripped:
+            return True
+        crawl_jobs.set_status(job["id"], "paused")
+        print(f"Crawl job {job['id']} paused: session expired")
+        wait_for_session(lambda: not checkpoint())
+        crawl_jobs.set_status(job["id"], "running")
+        return not crawl_jobs.is_cancelled(job["id"])
     
-    for doc_id in range(start_id, end_id + 1):
-        # Update current ID in status
-        crawl_status["current_id"] = doc_id
-        
-        # Skip if already crawled
-        if str(doc_id) in crawled_pdfs:
-            continue
+    next_retry_check = [0]
+    
+    def due_retries():
+        # Retries whose backoff has elapsed, checked about once a second
+        if time.time() < next_retry_check[0]:
+            return []
+        next_retry_check[0] = time.time() + 1
+        due = retry_queue.take_due(job["id"])
+        for doc_id in due:
+            cursor.retry(doc_id)
+        return due
+    
+    def pending_ids():
+        if linear:
+            doc_ids = range(cursor.start_id, end_id + 1)
+        elif job["strategy"] == "density":
+            doc_ids = scheduler.ordered_ids(cursor.start_id, end_id)
+        else:
+            # Replay jobs only work through the dead letters handed back to the retry queue
+            doc_ids = ()
+        for doc_id in doc_ids:
+            # Update current ID in status
+            crawl_status["current_id"] = doc_id
+            if cursor.checkpoint_due():
+                checkpoint()
+            if crawl_jobs.is_cancelled(job["id"]) or not pause_while_expired():
+                return
+            yield from due_retries()
             
+            # Skip hits and IDs probed recently without a hit
+            if not probe_map.should_probe(doc_id):
+                cursor.skip(doc_id)
+                continue
+            cursor.start(doc_id)
+            yield doc_id
+        
+        # The range is done; wait out the backoff of the remaining retries
+        while not crawl_jobs.is_cancelled(job["id"]) and pause_while_expired():
+            if cursor.checkpoint_due():
+                checkpoint()
+            due = due_retries()
+            yield from due
+            if not (cursor.idle() and pipeline.is_idle()):
+                # A probe or parse still in flight may yet record a retry for this job
+                if not due:
+                    time.sleep(0.1)
+                continue
+            remaining, wait = retry_queue.pending(job["id"])
+            if not remaining:
+                return
+            if not due:
+                time.sleep(min(max(wait, 0.1), 1.0))
+    
+    def document_failed(doc_id, e):
+        probe_map.mark(doc_id, ERROR)
+        outcome = retry_queue.fail(doc_id, job["id"], e, transient=is_transient(error=e))
+        print(f"Error processing document {doc_id}: {e} ({'will retry' if outcome == 'retry' else 'dead-lettered'})")
+    
+    def parse_failed(doc_id, e):
+        # The fallback download or storing the hit failed on the pipeline's finisher thread
+        document_failed(doc_id, e)
+        cursor.finish(doc_id)
+    
+    def probe_one(doc_id):
         try:
-            url = f"{BASE_URL}{doc_id}"
-            r = requests.get(url, headers=headers, timeout=10)
-            
-            if 'attachment; filename=' in r.headers.get('Content-Disposition', ''):
-                filename = r.headers['Content-Disposition'].split('filename=')[1].strip('"')
-                temp_path = os.path.join(temp_dir, filename)
-                
-                # Temporarily save the file to extract the title
-                with open(temp_path, 'wb') as f:
-                    f.write(r.content)
-                
-                # Extract PDF title
-                title = extract_pdf_title(temp_path)
-                
-                # Delete the temporary file
-                try:
-                    os.remove(temp_path)
-                except Exception as e:
-                    print(f"Error deleting temporary file: {e}")
-                
-                # Store in our database
-                crawled_pdfs[str(doc_id)] = {
-                    "id": doc_id,
-                    "filename": filename,
-                    "title": title,
-                    "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "direct_url": url
-                }
-                
-                crawl_status["total_found"] += 1
-                
-                # Save database periodically
-                if crawl_status["total_found"] % 10 == 0:
-                    save_crawl_database()
-                    
-                print(f"Found document {doc_id}: {title} (metadata only)")
+            # Headers decide; the body is only downloaded for an attachment.
+            # The client waits on the shared rate budget, so being nice to the server is enforced there.
+            r, filename = client.probe(doc_id)
             
-            # Be nice to the server - don't hammer it
-            time.sleep(1)
+            if filename is not None:
+                # Parsing happens in the pipeline, so the next request does not wait for it
+                # Cleared before the parse is queued, so it cannot erase a retry recorded by parse_failed
+                retry_queue.succeeded(doc_id)
+                pipeline.submit(r, doc_id, functools.partial(store_found_document, doc_id, filename, cursor=cursor,
+                                                             validators=document_validators(r)),
+                                functools.partial(parse_failed, doc_id))
+                return
+            login_redirect = is_login_redirect(r)
+            probe_map.mark(doc_id, status_for_response(r.status_code, False, login_redirect))
+            if login_redirect:
+                # Unverified, not missing: probe it again once the session is renewed
+                retry_queue.fail(doc_id, job["id"], "login redirect")
+            elif is_transient(status_code=r.status_code):
+                retry_queue.fail(doc_id, job["id"], f"HTTP {r.status_code}")
+            else:
+                retry_queue.succeeded(doc_id)
             
         except Exception as e:
-            print(f"Error processing document {doc_id}: {e}")
+            document_failed(doc_id, e)
+        cursor.finish(doc_id)
     
-    # Final save
-    save_crawl_database()
-    
-    # Cleanup temp directory if it's empty
     try:
-        os.rmdir(temp_dir)  # Only removes if empty
-    except:
-        pass
+        crawl_concurrently(pending_ids(), probe_one, CRAWL_CONCURRENCY)
         
-    crawl_status["is_running"] = False
-    print(f"Crawl completed. Found {crawl_status['total_found']} documents.")
+        # Let queued parses finish before the crawl is reported as done
+        pipeline.join()
+        checkpoint()
+        crawl_jobs.finish(job["id"])
+    finally:
+        # Also when the crawl raised; the job itself stays resumable from its last checkpoint
+        crawl_status["is_running"] = False
     
-@app.route('/')
-def index():
-    return redirect(url_for('ugm_search'))
+    if crawl_jobs.is_cancelled(job["id"]):
+        print(f"Crawl job {job['id']} cancelled after finding {crawl_status['total_found']} documents.")
+    else:
+        print(f"Crawl completed. Found {crawl_status['total_found']} documents.")
+    requests = client.requests_made - requests_before
+    if requests:
+        print(f"Yield: {(crawl_status['total_found'] - found_before) / requests:.3f} documents per request")
+    print(f"Connection stats: {client.stats()}")
+    
+def replay_dead_letters(doc_ids=None):
+    # Move dead letters (all, or the given IDs) back to the retry queue and queue a job to work through them
+    replayed = retry_queue.replay(doc_ids)
+    if not replayed:
+        return None
+    return crawl_queue.submit(min(replayed), max(replayed), "retry")
 
-@app.route('/ugm', methods=['GET', 'POST'])
-def ugm_search():
-    result = None
-    if request.method == 'POST':
-        doc_id = request.form.get('doc_id')
-        if doc_id:
-            headers = {'Cookie': f'ugmfw_session={SESSION_COOKIE}'}
-            url = f"{BASE_URL}{doc_id}"
-            r = requests.get(url, headers=headers)
-            
-            if 'attachment; filename=' in r.headers.get('Content-Disposition', ''):
-                filename = r.headers['Content-Disposition'].split('filename=')[1].strip('"')
-                
-                # Create a temporary directory
-                temp_dir = os.path.join("temp_downloads")
-                os.makedirs(temp_dir, exist_ok=True)
-                temp_path = os.path.join(temp_dir, filename)
-                
-                # Temporarily save for title extraction
-                with open(temp_path, 'wb') as f:
-                    f.write(r.content)
-                
-                # Extract PDF title
-                title = extract_pdf_title(temp_path)
-                
-                # Delete the file after getting the title
-                try:
-                    os.remove(temp_path)
-                except Exception as e:
-                    print(f"Error deleting temporary file: {e}")
-                
-                # Try to remove temp directory if empty
-                try:
-                    os.rmdir(temp_dir)
-                except:
-                    pass
-                
-                # Store in our database
-                crawled_pdfs[str(doc_id)] = {
-                    "id": doc_id,
-                    "filename": filename,
-                    "title": title,
-                    "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "direct_url": url
-                }
-                save_crawl_database()
-                
-                search_link = f"https://www.google.com/search?q={urllib.parse.quote(title)}"
-                download_link = f"{BASE_URL}{doc_id}"
-                result = f"""✅ Found: <a href='{download_link}' target='_blank'>{filename}</a><br>
-                         Title: {title}<br>
-                         <a href='{search_link}' target='_blank'>Search this title on Google</a>"""
-            else:
-                result = "❌ No PDF found or access denied."
+def run_crawl_job(job):
+    # Called by the crawl queue, one job at a time
+    if job["cursor"] >= job["start_id"]:
+        print(f"Resuming crawl job {job['id']} from ID {job['cursor'] + 1} to {job['end_id']}")
+    crawl_pdfs(job["start_id"], job["end_id"], job=job)
     
-    return render_template_string("""
+# Page templates, compiled once at startup rather than parsed and compiled on every request
+PDF_ROW_MACROS = """
+{% macro pdf_row(pdf, download_url, details=False, same_as=()) %}
+<tr>
+    <td>{{ pdf.id }}</td>
+    <td>{{ pdf.title }}</td>
+    {% if details %}
+    <td>{{ pdf.date }}</td>
+    <td>{{ same_as|join(', ') }}</td>
+    {% endif %}
+    <td>
+        <a href="{{ download_url }}" target="_blank">Download</a> |
+        <a href="https://www.google.com/search?q={{ pdf.title|urlencode }}" target="_blank">Search</a>
+    </td>
+</tr>
+{% endmacro %}
+"""
+
+UGM_PAGE_TEMPLATE = """
+    {% from "macros.html" import pdf_row %}
     <!DOCTYPE html>
     <html>
     <head>
@@ -257,6 +557,7 @@ def ugm_search():
                 <h3>Find PDF by Document ID</h3>
                 <form method="post">
                     <input type="text" name="doc_id" placeholder="Enter doc ID (e.g., 624012)" required>
+                    <label><input type="checkbox" name="refresh" value="1"> Refresh from server</label>
                     <input type="submit" value="Check PDF">
                 </form>
                 {% if result %}
@@ -268,6 +569,17 @@ def ugm_search():
             
             <div id="Crawler" class="tabcontent">
                 <h3>PDF Crawler</h3>
+                {% if session_state.tripped %}
+                <div class="result" style="border-left-color: #f44336">
+                    <h4>Session expired</h4>
+                    <p>{{ session_state.consecutive }} login redirects in a row since {{ session_state.tripped_at }}. Crawling is paused until the cookie is updated.</p>
+                </div>
+                {% endif %}
+                <form action="/ugm/session" method="post">
+                    <label for="session_cookie">Session cookie (ugmfw_session):</label>
+                    <input type="text" id="session_cookie" name="session_cookie" placeholder="New cookie value" required>
+                    <input type="submit" value="Update Cookie">
+                </form>
                 <p>Systematically check for PDFs in a range of IDs.</p>
                 <form action="/ugm/crawl" method="post">
                     <div>
@@ -278,7 +590,14 @@ def ugm_search():
                         <label for="end_id">End ID:</label>
                         <input type="number" id="end_id" name="end_id" value="1000" min="1" max="9999999" required>
                     </div>
-                    <input type="submit" value="Start Crawling">
+                    <div>
+                        <label for="strategy">Order:</label>
+                        <select id="strategy" name="strategy">
+                            <option value="linear">Every ID in order</option>
+                            <option value="density">Densest blocks first (sample, then rank)</option>
+                        </select>
+                    </div>
+                    <input type="submit" value="Queue Crawl">
                 </form>
                 
                 {% if crawl_active %}
@@ -287,8 +606,106 @@ def ugm_search():
                     <p>Currently scanning IDs: {{ current_id }} / {{ end_id }}</p>
                     <p>Documents found: {{ total_found }}</p>
                     <p>Running time: {{ running_time }}</p>
+                    <p>Connections: {{ connection_stats.connections_opened }} opened, {{ connection_stats.connections_reused }} reused</p>
+                    <p>Parse queue: {{ pipeline_status.in_flight }} / {{ pipeline_status.queue_depth }} ({{ pipeline_status.workers }} workers, {{ pipeline_status.backpressure_waits }} backpressure waits, {{ pipeline_status.reused }} titles reused without parsing; title cache {{ title_cache.entries }} entries, {{ title_cache.hits }} hits)</p>
+                    <p>Request rate: {{ rate_control.rate }} req/s shared (ceiling {{ rate_control.ceiling }}, latency {{ rate_control.latency_ms }} ms), {{ concurrency }} in flight</p>
+                    {% for reason in rate_control.recent_backoffs %}
+                    <p>Back-off: {{ reason }}</p>
+                    {% endfor %}
+                </div>
+                {% elif rate_control.recent_backoffs %}
+                <div class="result">
+                    <p>Request rate: {{ rate_control.rate }} req/s shared (ceiling {{ rate_control.ceiling }})</p>
+                    {% for reason in rate_control.recent_backoffs %}
+                    <p>Back-off: {{ reason }}</p>
+                    {% endfor %}
                 </div>
                 {% endif %}
+                
+                {% if jobs %}
+                <h4>Crawl Jobs</h4>
+                <table>
+                    <tr>
+                        <th>Job</th>
+                        <th>Range</th>
+                        <th>Committed ID</th>
+                        <th>Found</th>
+                        <th>Status</th>
+                        <th>Actions</th>
+                    </tr>
+                    {% for job in jobs %}
+                    <tr>
+                        <td>{{ job.id }} ({{ job.owner }})</td>
+                        <td>{{ job.start_id }} - {{ job.end_id }} ({{ job.strategy }})</td>
+                        <td>{{ job.cursor }}</td>
+                        <td>{{ job.found }}</td>
+                        <td>{{ job.status }}</td>
+                        <td>
+                            {% if job.status in ('queued', 'running', 'paused') %}
+                            <form action="/ugm/crawl/{{ job.id }}/cancel" method="post" style="margin: 0">
+                                <input type="submit" value="Cancel">
+                            </form>
+                            {% endif %}
+                        </td>
+                    </tr>
+                    {% endfor %}
+                </table>
+                {% endif %}
+                
+                <h4>Follow New Uploads</h4>
+                <p>Find the highest live ID, then keep checking just past it for new theses.</p>
+                <form action="/ugm/follow" method="post">
+                    {% if follow.running %}
+                    <p>Status: {{ follow.phase }}, high-water mark {{ follow.mark or 'not found yet' }}, {{ follow.found }} new from {{ follow.probes }} probes{% if follow.last_found %}, last {{ follow.last_found }}{% endif %}</p>
+                    <input type="hidden" name="action" value="stop">
+                    <input type="submit" value="Stop Following">
+                    {% else %}
+                    <input type="hidden" name="action" value="start">
+                    <input type="submit" value="Start Following">
+                    {% endif %}
+                </form>
+                
+                <h4>Refresh Stored Documents</h4>
+                <p>Re-check stored documents older than {{ refresh_max_age_days }} days with conditional requests; titles are only extracted again for files that changed.</p>
+                <form action="/ugm/refresh" method="post">
+                    {% if refresh.running %}
+                    <p>Status: {{ refresh.due }} due, {{ refresh.checked }} checked ({{ refresh.unchanged }} unchanged, {{ refresh.changed }} changed, {{ refresh.gone }} gone, {{ refresh.failed }} failed){% if refresh.last_changed %}, last change {{ refresh.last_changed }}{% endif %}</p>
+                    <input type="hidden" name="action" value="stop">
+                    <input type="submit" value="Stop Refreshing">
+                    {% else %}
+                    <input type="hidden" name="action" value="start">
+                    <input type="submit" value="Start Refreshing">
+                    {% endif %}
+                </form>
+                
+                <h4>Failed Probes</h4>
+                <p>{{ retry_counts.retrying }} waiting to be retried, {{ retry_counts.dead }} dead-lettered after {{ retry_max_attempts }} attempts.</p>
+                {% if dead_letters %}
+                <form action="/ugm/dead-letters/replay" method="post">
+                    <input type="submit" value="Replay All">
+                </form>
+                <table>
+                    <tr>
+                        <th>ID</th>
+                        <th>Attempts</th>
+                        <th>Last Error</th>
+                        <th>Actions</th>
+                    </tr>
+                    {% for letter in dead_letters %}
+                    <tr>
+                        <td>{{ letter.doc_id }}</td>
+                        <td>{{ letter.attempts }}</td>
+                        <td>{{ letter.last_error }}</td>
+                        <td>
+                            <form action="/ugm/dead-letters/replay" method="post" style="margin: 0">
+                                <input type="hidden" name="doc_id" value="{{ letter.doc_id }}">
+                                <input type="submit" value="Replay">
+                            </form>
+                        </td>
+                    </tr>
+                    {% endfor %}
+                </table>
+                {% endif %}
             </div>
             
             <div id="Database" class="tabcontent">
@@ -296,6 +713,10 @@ def ugm_search():
                 <p>Search through found PDFs:</p>
                 <form action="/ugm/database" method="get">
                     <input type="text" name="search" placeholder="Search by title..." value="{{ search_term }}">
+                    <select name="match">
+                        <option value="words">Words (ranked)</option>
+                        <option value="fuzzy">Substring / typo-tolerant</option>
+                    </select>
                     <input type="submit" value="Search">
                 </form>
                 
@@ -308,14 +729,7 @@ def ugm_search():
                         <th>Actions</th>
                     </tr>
                     {% for pdf in pdfs %}
-                    <tr>
-                        <td>{{ pdf.id }}</td>
-                        <td>{{ pdf.title }}</td>
-                        <td>
-                            <a href="/ugm/download/{{ pdf.filename }}">Download</a> |
-                            <a href="https://www.google.com/search?q={{ pdf.title|urlencode }}" target="_blank">Search</a>
-                        </td>
-                    </tr>
+                    {{ pdf_row(pdf, "/ugm/download/" ~ pdf.filename) }}
                     {% endfor %}
                 </table>
                 {% else %}
@@ -341,52 +755,10 @@ def ugm_search():
         </script>
     </body>
     </html>
-    """, result=result, crawl_active=crawl_status["is_running"], 
-         current_id=crawl_status["current_id"], 
-         end_id=crawl_status["end_id"],
-         total_found=crawl_status["total_found"],
-         running_time="N/A" if not crawl_status["start_time"] else f"{int(time.time() - crawl_status['start_time'])} seconds",
-         pdf_count=len(crawled_pdfs),
-         pdfs=[],
-         showing_count=0,
-         search_term="")
+"""
 
-@app.route('/ugm/download/<doc_id>')
-def download_file(doc_id):
-    if doc_id in crawled_pdfs:
-        # Redirect user to the original source URL
-        return redirect(f"{BASE_URL}{doc_id}")
-    else:
-        return "Document not found in database.", 404
-
-@app.route('/ugm/crawl', methods=['POST'])
-def start_crawl():
-    if not crawl_status["is_running"]:
-        start_id = int(request.form.get('start_id', 1))
-        end_id = int(request.form.get('end_id', 1000))
-        
-        # Start crawling in a separate thread
-        thread = threading.Thread(target=crawl_pdfs, args=(start_id, end_id))
-        thread.daemon = True
-        thread.start()
-        
-    return redirect(url_for('ugm_search'))
-@app.route('/ugm/database')
-def database():
-    search_term = request.args.get('search', '').lower()
-    
-    if search_term:
-        filtered_pdfs = [
-            pdf_data for pdf_id, pdf_data in crawled_pdfs.items()
-            if search_term in pdf_data["title"].lower()
-        ]
-    else:
-        filtered_pdfs = list(crawled_pdfs.values())
-    
-    # Sort by ID
-    filtered_pdfs.sort(key=lambda x: int(x["id"]))
-    
-    return render_template_string("""
+DATABASE_PAGE_TEMPLATE = """
+    {% from "macros.html" import pdf_row %}
     <!DOCTYPE html>
     <html>
     <head>
@@ -416,10 +788,21 @@ def database():
             
             <form action="/ugm/database" method="get">
                 <input type="text" name="search" placeholder="Search by title..." value="{{ search_term }}">
+                <select name="match">
+                    <option value="words">Words (ranked)</option>
+                    <option value="fuzzy" {% if fuzzy %}selected{% endif %}>Substring / typo-tolerant</option>
+                </select>
+                <label><input type="checkbox" name="duplicates" value="1" {% if duplicates_only %}checked{% endif %}> Duplicates only</label>
+                <select name="limit">
+                    {% for size in page_sizes %}
+                    <option value="{{ size }}" {% if size == limit %}selected{% endif %}>{{ size }} per page</option>
+                    {% endfor %}
+                </select>
                 <input type="submit" value="Search">
             </form>
             
-            <p>Showing {{ showing_count }} of {{ pdf_count }} documents</p>
+            <p>Showing {% if pdfs %}{{ start + 1 }}-{{ start + pdfs|length }}{% else %}0{% endif %} of {{ total }}{% if total != pdf_count %} matching{% endif %} ({{ pdf_count }} documents stored){% if ranked %}, best matches first{% endif %}{% if duplicate_groups %} ({{ duplicate_groups }} files stored under more than one ID){% endif %}
+               | <a href="{{ url_for('export_database', **page_args) }}">Export CSV</a></p>
             
             {% if pdfs %}
             <table>
@@ -427,29 +810,336 @@ def database():
                     <th>ID</th>
                     <th>Title</th>
                     <th>Date Added</th>
+                    <th>Same File As</th>
                     <th>Actions</th>
                 </tr>
                 {% for pdf in pdfs %}
-                <tr>
-                    <td>{{ pdf.id }}</td>
-                    <td>{{ pdf.title }}</td>
-                    <td>{{ pdf.date }}</td>
-                    <td>
-                        <a href="{{ base_url }}{{ pdf.id }}" target="_blank">Download</a> |
-                        <a href="https://www.google.com/search?q={{ pdf.title|urlencode }}" target="_blank">Search</a>
-                    </td>
-                </tr>
+                {{ pdf_row(pdf, base_url ~ pdf.id, details=True, same_as=same_file.get(pdf.id|int, [])|reject('equalto', pdf.id|int)) }}
                 {% endfor %}
             </table>
+            <div class="nav">
+                {% if start > 0 %}<a href="{{ url_for('database', before=pdfs[0].id, **page_args) }}">&laquo; Previous</a>{% endif %}
+                {% if start + pdfs|length < total %}<a href="{{ url_for('database', after=pdfs[-1].id, **page_args) }}">Next &raquo;</a>{% endif %}
+            </div>
             {% else %}
             <p>No PDFs found matching your search criteria.</p>
             {% endif %}
         </div>
     </body>
     </html>
-    """, pdfs=filtered_pdfs, showing_count=len(filtered_pdfs), 
-         pdf_count=len(crawled_pdfs), search_term=search_term, base_url=BASE_URL)
+"""
+
+app.jinja_loader = DictLoader({
+    "macros.html": PDF_ROW_MACROS,
+    "ugm.html": UGM_PAGE_TEMPLATE,
+    "database.html": DATABASE_PAGE_TEMPLATE,
+})
+for template_name in app.jinja_loader.list_templates():
+    app.jinja_env.get_template(template_name)  # Parsed and compiled here; later renders reuse the cached template
+
+@app.route('/')
+def index():
+    return redirect(url_for('ugm_search'))
+
+def stored_result(record, source):
+    """Lookup result for a stored record; source is "store" or "server" """
+    return {
+        "found": True,
+        "filename": record["filename"],
+        "title": record["title"],
+        "download_url": client.url_for(record["id"]),
+        "size": record.get("size"),
+        "source": source,
+        "checked": record.get("checked") or record.get("date"),
+    }
+
+def search_pdf_by_id(doc_id, refresh=False):
+    """Search for a PDF by document ID; a fresh stored record is answered without any request unless refresh is set"""
+    known = crawled_pdfs.get(str(doc_id))
+    if known is None and crawl_store is not None and str(doc_id).isdigit():
+        # Another process sharing the store may have found it since this one loaded
+        known = crawl_store.get(int(doc_id))
+        if known is not None:
+            index_record(known)
+    if known is not None and not refresh and is_fresh(known, LOOKUP_MAX_AGE_DAYS):
+        return stored_result(known, "store")
+    try:
+        return lookups.do(str(doc_id), functools.partial(fetch_pdf_by_id, doc_id))
+    except Exception as e:
+        return {"found": False, "message": f"Error: {str(e)}"}
+
+def fetch_pdf_by_id(doc_id):
+    """Ask the server about one ID; interactive lookups go ahead of any running crawl in the rate budget and parse queue"""
+    if str(doc_id) in crawled_pdfs:
+        # A known ID is re-validated with a conditional request; the title is only re-extracted if the file changed
+        outcome = refresh_document(int(doc_id), priority=True)
+        if outcome in (UNCHANGED, CHANGED):
+            return stored_result(crawled_pdfs[str(doc_id)], "server")
+        if outcome == GONE:
+            return {"found": False, "message": "No PDF found or access denied"}
+        # The check already spent this lookup's request; answer from the store rather than probing again
+        return stored_result(crawled_pdfs[str(doc_id)], "store")
+    
+    r, filename = client.probe(doc_id, priority=True)
+    has_attachment = filename is not None
+    login_redirect = not has_attachment and is_login_redirect(r)
+    
+    # Let the crawler skip this ID too
+    if probe_map is not None and str(doc_id).isdigit():
+        probe_map.mark(int(doc_id), status_for_response(r.status_code, has_attachment, login_redirect))
+        try:
+            # One mark per lookup would otherwise wait in memory for the autosave threshold
+            probe_map.save()
+        except Exception as e:
+            print(f"Error saving probe state: {e}")
+    
+    if has_attachment:
+        # Parse the title from a bounded prefix of the download
+        title, bytes_transferred, content = pipeline.extract_from_response(r, doc_id, priority=True)
+        record = {
+            "id": int(doc_id),
+            "filename": filename,
+            "title": title,
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "direct_url": client.url_for(doc_id),
+            "bytes_transferred": bytes_transferred,
+            **document_validators(r),
+            **content
+        }
+        # Store in our database
+        save_crawl_database(record)
+        return stored_result(record, "server")
+    elif login_redirect:
+        return {"found": False, "login_redirect": True, "message": "Session expired: the server asked for a login. Update the session cookie in the Crawler tab."}
+    else:
+        return {"found": False, "message": "No PDF found or access denied"}
+
+@app.route('/ugm', methods=['GET', 'POST'])
+def ugm_search():
+    result = None
+    if request.method == 'POST':
+        doc_id = request.form.get('doc_id')
+        if doc_id:
+            lookup = search_pdf_by_id(doc_id, refresh=request.form.get('refresh') == '1')
+            if lookup["found"]:
+                title = lookup["title"]
+                search_link = f"https://www.google.com/search?q={urllib.parse.quote(title)}"
+                if lookup["source"] == "store":
+                    source = f"From the database, last checked {lookup['checked']}"
+                else:
+                    source = "Checked on the server just now"
+                result = f"""✅ Found: <a href='{lookup['download_url']}' target='_blank'>{lookup['filename']}</a><br>
+                         Title: {title}<br>
+                         <small>{source}</small><br>
+                         <a href='{search_link}' target='_blank'>Search this title on Google</a>"""
+            elif lookup.get("login_redirect"):
+                result = f"🔐 {lookup['message']}"
+            else:
+                result = f"❌ {lookup['message']}"
+    
+    return render_template("ugm.html", result=result, crawl_active=crawl_status["is_running"], 
+         current_id=crawl_status["current_id"], 
+         end_id=crawl_status["end_id"],
+         total_found=crawl_status["total_found"],
+         running_time="N/A" if not crawl_status["start_time"] else f"{int(time.time() - crawl_status['start_time'])} seconds",
+         connection_stats=client.stats(),
+         pipeline_status=pipeline.status(),
+         title_cache=pipeline.title_cache.status() if pipeline.title_cache else {},
+         rate_control=client.rate_controller.status() if client.rate_controller else {},
+         concurrency=CRAWL_CONCURRENCY,
+         jobs=crawl_jobs.recent() if crawl_jobs else [],
+         follow=follower.state if follower else {},
+         refresh=refresher.state if refresher else {},
+         refresh_max_age_days=REFRESH_MAX_AGE_DAYS,
+         session_state=client.breaker.state if client.breaker else {},
+         retry_counts=retry_queue.counts() if retry_queue else {"retrying": 0, "dead": 0},
+         retry_max_attempts=RETRY_MAX_ATTEMPTS,
+         dead_letters=retry_queue.dead_letters() if retry_queue else [],
+         pdf_count=len(crawled_pdfs),
+         pdfs=[],
+         showing_count=0,
+         search_term="")
+
+@app.route('/ugm/download/<doc_id>')
+def download_file(doc_id):
+    if doc_id in crawled_pdfs:
+        # Redirect user to the original source URL
+        return redirect(f"{BASE_URL}{doc_id}")
+    else:
+        return "Document not found in database.", 404
+
+@app.route('/ugm/crawl', methods=['POST'])
+def start_crawl():
+    start_id = int(request.form.get('start_id', 1))
+    end_id = int(request.form.get('end_id', 1000))
+    strategy = request.form.get('strategy', 'linear')
+    if strategy not in ('linear', 'density'):
+        strategy = 'linear'
+    
+    # Queue the range; the crawl queue runs jobs one after another
+    crawl_queue.submit(start_id, end_id, strategy)
+    
+    return redirect(url_for('ugm_search'))
+
+@app.route('/ugm/crawl/<int:job_id>/cancel', methods=['POST'])
+def cancel_crawl(job_id):
+    crawl_jobs.cancel(job_id)
+    return redirect(url_for('ugm_search'))
+
+@app.route('/ugm/dead-letters/replay', methods=['POST'])
+def replay_failed():
+    # One ID from its row, or every dead letter
+    doc_id = request.form.get('doc_id')
+    replay_dead_letters([int(doc_id)] if doc_id and doc_id.isdigit() else None)
+    return redirect(url_for('ugm_search'))
+
+@app.route('/ugm/session', methods=['POST'])
+def update_session():
+    # A paused crawl in any process picks the new cookie up from the cookie file
+    session_cookie = request.form.get('session_cookie', '').strip()
+    if session_cookie:
+        update_session_cookie(session_cookie)
+    return redirect(url_for('ugm_search'))
+
+@app.route('/ugm/follow', methods=['POST'])
+def toggle_follow():
+    # Follow mode runs beside queued crawls and shares the same rate budget
+    if request.form.get('action') == 'stop':
+        follower.stop()
+    else:
+        follower.start()
+    return redirect(url_for('ugm_search'))
+
+@app.route('/ugm/refresh', methods=['POST'])
+def toggle_refresh():
+    # Refreshing runs beside queued crawls and shares the same rate budget
+    if request.form.get('action') == 'stop':
+        refresher.stop()
+    else:
+        refresher.start()
+    return redirect(url_for('ugm_search'))
+def matching_ids(search_term, fuzzy, duplicates_only, same_file):
+    # Matching IDs in display order (None for every stored document, paged from id_index),
+    # and whether that order is by relevance
+    ranked = bool(search_term) and not duplicates_only
+    if not search_term:
+        ids = None
+    elif fuzzy:
+        # Titles containing the text first, then near misses (typos, OCR slips); bounded, since
+        # an unlimited search builds and scores every candidate
+        ids = [doc_id for doc_id, score in title_index.search(search_term, limit=FUZZY_MATCH_LIMIT)]
+    else:
+        # Best BM25 match first; only the postings of the query words are touched
+        ids = [doc_id for doc_id, score in search_index.search(search_term)]
+        if not ids:
+            # Nothing indexable in the query (e.g. only stop words), so fall back to a substring match
+            ids = sorted(int(pdf_id) for pdf_id, pdf_data in crawled_pdfs.items()
+                         if search_term in pdf_data["title"].lower())
+            ranked = False
+    
+    if duplicates_only:
+        # Keep each group together, ordered by its lowest ID
+        ids = [doc_id for doc_id in (same_file if ids is None else ids) if doc_id in same_file]
+        ids.sort(key=lambda doc_id: (same_file[doc_id][0], doc_id))
+    return ids, ranked
+
+def page_of(ids, after=None, before=None, limit=DATABASE_PAGE_SIZE):
+    # Keyset page over an ordered ID list; a cursor that is no longer in the list restarts from the top
+    try:
+        if before is not None:
+            end = ids.index(before)
+            start = max(0, end - limit)
+        else:
+            start = ids.index(after) + 1 if after is not None else 0
+            end = start + limit
+    except ValueError:
+        start, end = 0, limit
+    return ids[start:end], start, len(ids)
+
+def int_arg(name):
+    try:
+        return int(request.args[name])
+    except (KeyError, ValueError):
+        return None
+
+@app.route('/ugm/database')
+@response_cache.cached(store_version)
+def database():
+    search_term = request.args.get('search', '').lower()
+    fuzzy = request.args.get('match') == 'fuzzy'
+    duplicates_only = request.args.get('duplicates') == '1'
+    limit = min(max(int_arg('limit') or DATABASE_PAGE_SIZE, 1), DATABASE_MAX_PAGE_SIZE)
+    after, before = int_arg('after'), int_arg('before')
+    
+    # Records sharing a prefix hash and size are the same file under several IDs
+    duplicates = hash_index.duplicates()
+    same_file = {doc_id: ids for ids in duplicates.values() for doc_id in ids}
+    
+    ids, ranked = matching_ids(search_term, fuzzy, duplicates_only, same_file)
+    if ids is None:
+        # Every document in ID order: pages come straight off the pre-sorted index
+        page_ids, start, total = id_index.page(after=after, before=before, limit=limit)
+    else:
+        page_ids, start, total = page_of(ids, after=after, before=before, limit=limit)
+    pdfs = [crawled_pdfs[str(doc_id)] for doc_id in page_ids if str(doc_id) in crawled_pdfs]
+    
+    # Carried over by the page and export links
+    page_args = {
+        "search": search_term or None,
+        "match": "fuzzy" if fuzzy else None,
+        "duplicates": "1" if duplicates_only else None,
+        "limit": limit if limit != DATABASE_PAGE_SIZE else None,
+    }
+    
+    return render_template("database.html", pdfs=pdfs, start=start, total=total, limit=limit, page_sizes=DATABASE_PAGE_SIZES, page_args=page_args,
+         pdf_count=len(crawled_pdfs), search_term=search_term, base_url=BASE_URL,
+         fuzzy=fuzzy, duplicates_only=duplicates_only, duplicate_groups=len(duplicates), same_file=same_file,
+         ranked=ranked)
+
+@app.route('/ugm/database/export')
+def export_database():
+    # Same filters as the database view, every match as CSV; rows are generated and sent in chunks,
+    # so memory stays flat however large the database grows
+    search_term = request.args.get('search', '').lower()
+    duplicates = hash_index.duplicates()
+    same_file = {doc_id: ids for ids in duplicates.values() for doc_id in ids}
+    ids, ranked = matching_ids(search_term, request.args.get('match') == 'fuzzy',
+                               request.args.get('duplicates') == '1', same_file)
+    
+    def chunks():
+        if ids is None:
+            # Walk the pre-sorted index by keyset, one chunk at a time
+            after = None
+            while True:
+                page_ids, start, total = id_index.page(after=after, limit=EXPORT_CHUNK_SIZE)
+                if not page_ids:
+                    return
+                yield page_ids
+                after = page_ids[-1]
+        else:
+            for start in range(0, len(ids), EXPORT_CHUNK_SIZE):
+                yield ids[start:start + EXPORT_CHUNK_SIZE]
+    
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for page_ids in chunks():
+            for doc_id in page_ids:
+                record = crawled_pdfs.get(str(doc_id))
+                if record is not None:
+                    writer.writerow([record.get(column, "") for column in EXPORT_COLUMNS])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    return Response(generate(), mimetype='text/csv',
+                    headers={"Content-Disposition": "attachment; filename=crawled_pdfs.csv"})
 
 if __name__ == '__main__':
-    load_crawl_database()
+    # The debug reloader runs this script twice; only the serving child process opens the stores
+    # (journal mode admits a single process) and runs crawls, resuming an interrupted job first
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        load_crawl_database()
+        crawl_queue.start()
     app.run(debug=True, host='0.0.0.0', port=1234)
\ No newline at end of file
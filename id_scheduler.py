@@ -0,0 +1,213 @@
+"""
+ID Scheduler for ETD UGM Crawler
+Decides which IDs to probe: density-ordered crawls over large ranges,
+and a follow mode that tracks the newest uploads past the high-water mark
+"""
+
+import time
+import random
+import threading
+import logging
+
+from probe_state import NOT_FOUND, DENIED, FOUND
+
+logger = logging.getLogger(__name__)
+
+
+class DensityScheduler:
+    def __init__(self, probe_map, block_size=1000, samples_per_block=16,
+                 prior_hits=1.0, prior_probes=100.0, min_density=0.0):
+        self.probe_map = probe_map
+        self.block_size = block_size
+        self.samples_per_block = samples_per_block
+        # Unsampled blocks are assumed to hold prior_hits per prior_probes IDs
+        self.prior_hits = prior_hits
+        self.prior_probes = prior_probes
+        self.min_density = min_density  # Blocks estimated below this are not crawled in full
+
+    def blocks(self, start_id, end_id):
+        """Block-aligned (lo, hi) ranges covering [start_id, end_id]"""
+        lo = start_id
+        while lo <= end_id:
+            hi = min((lo // self.block_size + 1) * self.block_size - 1, end_id)
+            yield lo, hi
+            lo = hi + 1
+
+    def expected_yield(self, lo, hi):
+        """(hits expected among the block's unprobed IDs, smoothed hit density) from the probe state"""
+        counts = self.probe_map.counts(lo, hi)
+        probed = counts[FOUND] + counts[NOT_FOUND] + counts[DENIED]
+        density = (counts[FOUND] + self.prior_hits) / (probed + self.prior_probes)
+        return density * (hi - lo + 1 - probed), density
+
+    def sample_ids(self, start_id, end_id):
+        """Evenly spaced sample IDs in every block, with an offset fixed per block so a resumed scan reuses them"""
+        for lo, hi in self.blocks(start_id, end_id):
+            size = hi - lo + 1
+            count = min(self.samples_per_block, size)
+            stride = size / count
+            offset = random.Random(lo).random() * stride
+            for k in range(count):
+                yield lo + int(offset + k * stride)
+
+    def ordered_ids(self, start_id, end_id):
+        """Sample IDs first, then every ID of each block in descending expected yield"""
+        sampled = set()
+        for doc_id in self.sample_ids(start_id, end_id):
+            sampled.add(doc_id)
+            yield doc_id
+
+        ranked = []
+        for lo, hi in self.blocks(start_id, end_id):
+            expected, density = self.expected_yield(lo, hi)
+            if density >= self.min_density:
+                ranked.append((expected, lo, hi))
+        ranked.sort(key=lambda block: -block[0])
+        if ranked:
+            logger.info(
+                f"Crawling {len(ranked)} blocks by expected yield "
+                f"(best {ranked[0][0]:.1f} hits in {ranked[0][1]}-{ranked[0][2]})"
+            )
+
+        for expected, lo, hi in ranked:
+            # Samples may still be in flight, so they are not handed out twice
+            yield from (doc_id for doc_id in range(lo, hi + 1) if doc_id not in sampled)
+
+
+def find_high_water_mark(is_hit, known, span=200, samples=64):
+    """
+    Highest live ID, found by galloping up from a known hit and bisecting back.
+    IDs are sparse, so a point counts as live when any of `samples` IDs spread
+    over the `span` IDs above it is a hit. A sparse window can look empty by
+    chance, so the search is repeated from its result until the mark stops moving.
+    """
+    def hit_above(x):
+        # Top sample first, so a live window usually costs one probe
+        for k in reversed(range(samples)):
+            doc_id = x + k * span // samples
+            if is_hit(doc_id):
+                return doc_id
+        return None
+
+    def search(lo):
+        # Gallop: double the step until a window comes back empty
+        step = span
+        while True:
+            hit = hit_above(lo + step)
+            if hit is None:
+                hi = lo + step
+                break
+            lo, step = hit, step * 2
+
+        # Bisect between the last hit and the first empty window
+        while hi - lo > span:
+            mid = (lo + hi) // 2
+            hit = hit_above(mid)
+            if hit is None:
+                hi = mid
+            else:
+                lo, hi = hit, max(hi, hit + 1)
+        return lo
+
+    mark = search(known)
+    while True:
+        higher = search(mark)
+        if higher <= mark:
+            return mark
+        mark = higher
+
+
+class Follower:
+    """
+    Follow mode: find the high-water mark once, then keep probing just past it
+    at a low fixed rate so new uploads are picked up as they appear
+    """
+
+    def __init__(self, probe_one, probe_map, start_id, lookahead=50, seconds_per_probe=5.0,
+                 idle_seconds=300.0, span=200, samples=64):
+        self.probe_one = probe_one  # probe_one(doc_id) -> True for a hit, which it stores
+        self.probe_map = probe_map
+        self.start_id = start_id  # Where discovery starts when nothing has been found yet
+        self.lookahead = lookahead  # IDs past the mark checked on every sweep
+        self.seconds_per_probe = seconds_per_probe
+        self.idle_seconds = idle_seconds  # Pause after a sweep without hits
+        self.span = span
+        self.samples = samples
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # Live view for status pages; mutated in place
+        self.state = {
+            "running": False,
+            "phase": None,
+            "mark": None,
+            "probes": 0,
+            "found": 0,
+            "last_found": None,
+        }
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _probe(self, doc_id):
+        self.state["probes"] += 1
+        try:
+            hit = self.probe_one(doc_id)
+        finally:
+            self._save()
+        if not hit:
+            return False
+        self.state["found"] += 1
+        self.state["last_found"] = f"{doc_id} ({time.strftime('%Y-%m-%d %H:%M:%S')})"
+        return True
+
+    def _save(self):
+        # A few marks an hour never reach the map's autosave threshold, so persist every tick
+        try:
+            self.probe_map.save()
+        except Exception as e:
+            logger.error(f"Error saving probe state: {e}")
+
+    def _is_hit(self, doc_id):
+        # Known hits cost nothing; everything else is probed, since misses may have been filled since
+        status, _ = self.probe_map.lookup(doc_id)
+        if status == FOUND:
+            return True
+        if self.stop_event.is_set():
+            return False
+        return self._probe(doc_id)
+
+    def _run(self):
+        self.state["running"] = True
+        try:
+            self.state["phase"] = "discovering"
+            known = self.probe_map.highest(FOUND) or self.start_id
+            mark = find_high_water_mark(self._is_hit, known, self.span, self.samples)
+            self.state["mark"] = mark
+            logger.info(f"High-water mark at ID {mark}, following")
+
+            self.state["phase"] = "following"
+            while not self.stop_event.is_set():
+                found = False
+                for doc_id in range(mark + 1, mark + self.lookahead + 1):
+                    if self.stop_event.wait(self.seconds_per_probe):
+                        break
+                    if self._probe(doc_id):
+                        # Start the next sweep just past the new upload
+                        mark = self.state["mark"] = doc_id
+                        found = True
+                        break
+                if not found:
+                    self.stop_event.wait(self.idle_seconds)
+        except Exception as e:
+            logger.error(f"Follow mode stopped: {e}")
+        finally:
+            self.state["running"] = False
+            self.state["phase"] = None
@@ -0,0 +1,253 @@
+"""
+Probe State for ETD UGM Crawler
+Run-length map of per-ID probe results so misses are not fetched again on every crawl,
+shared by every process through SQLite
+"""
+
+import os
+import json
+import time
+import bisect
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Probe statuses
+NOT_FOUND = 1
+DENIED = 2
+ERROR = 3
+FOUND = 4
+UNVERIFIED = 5  # Answered with a login page; says nothing about the document
+
+STATUS_NAMES = {
+    NOT_FOUND: "not_found",
+    DENIED: "denied",
+    ERROR: "error",
+    FOUND: "found",
+    UNVERIFIED: "unverified",
+}
+
+
+def status_for_response(status_code, has_attachment, login_redirect=False):
+    """Classify an HTTP response into a probe status"""
+    if has_attachment:
+        return FOUND
+    if login_redirect:
+        return UNVERIFIED
+    if status_code in (401, 403):
+        return DENIED
+    if status_code == 429 or status_code >= 500:
+        return ERROR
+    return NOT_FOUND
+
+
+class ProbeMap:
+    """
+    Sorted, non-overlapping runs of (start, end, status, stamp).
+    Consecutive IDs probed with the same result in the same time bucket
+    share one run, so a crawled stretch of misses costs a single entry.
+    The runs live in memory and are saved to SQLite, which every process shares: a save merges
+    this process's marks since the last save into the stored runs and reloads the result,
+    so processes pick up each other's probes instead of overwriting them.
+    """
+
+    def __init__(self, path, miss_ttl_days=30, resolution=3600, save_every=500, legacy_path=None):
+        self.path = path
+        self.miss_ttl = miss_ttl_days * 86400
+        self.resolution = resolution  # Seconds per probe time bucket
+        self.save_every = save_every
+        self.lock = threading.Lock()
+        self.starts = []
+        self.ends = []
+        self.statuses = []
+        self.stamps = []
+        self.unsaved = []  # (doc_id, status, stamp) marked since the last save
+        # Transactions are explicit, so a save's read and write happen under one write lock
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                start INTEGER PRIMARY KEY,
+                end INTEGER NOT NULL,
+                status INTEGER NOT NULL,
+                stamp INTEGER NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if legacy_path:
+            self.migrate_json(legacy_path)
+        self.load()
+
+    def migrate_json(self, json_path):
+        """One-time import of the legacy probe_state.json run list"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                migrated = self.conn.execute("SELECT value FROM meta WHERE key = 'migrated_from_json'").fetchone()
+                if migrated or not os.path.exists(json_path):
+                    return
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if not self.conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]:
+                    self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('resolution', ?)",
+                                      (str(data.get("resolution", self.resolution)),))
+                    self.conn.executemany("INSERT INTO runs (start, end, status, stamp) VALUES (?, ?, ?, ?)",
+                                          [tuple(run) for run in data["runs"]])
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', ?)",
+                                  (json_path,))
+                logger.info(f"Migrated {len(data['runs'])} probe runs from {json_path}")
+            finally:
+                self.conn.execute("COMMIT")
+
+    def load(self):
+        with self.lock:
+            self._reload()
+        logger.info(f"Loaded {len(self.starts)} probe runs from {self.path}")
+
+    def _reload(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'resolution'").fetchone()
+        if row is not None:
+            self.resolution = int(row[0])
+        rows = self.conn.execute("SELECT start, end, status, stamp FROM runs ORDER BY start").fetchall()
+        self.starts = [row[0] for row in rows]
+        self.ends = [row[1] for row in rows]
+        self.statuses = [row[2] for row in rows]
+        self.stamps = [row[3] for row in rows]
+
+    def save(self):
+        """Merge this process's new marks into the shared runs, and pick up everyone else's"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._reload()
+                for doc_id, status, stamp in self.unsaved:
+                    i = self._find(doc_id)
+                    if i < 0 or self.stamps[i] <= stamp:  # A newer result from another process wins
+                        self._apply(doc_id, status, stamp)
+                self.conn.execute("DELETE FROM runs")
+                self.conn.executemany(
+                    "INSERT INTO runs (start, end, status, stamp) VALUES (?, ?, ?, ?)",
+                    zip(self.starts, self.ends, self.statuses, self.stamps),
+                )
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('resolution', ?)",
+                                  (str(self.resolution),))
+                self.conn.execute("COMMIT")
+                self.unsaved = []
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _find(self, doc_id):
+        """Index of the run containing doc_id, or -1"""
+        i = bisect.bisect_right(self.starts, doc_id) - 1
+        if i >= 0 and self.ends[i] >= doc_id:
+            return i
+        return -1
+
+    def lookup(self, doc_id):
+        """Return (status, probed_at) for an ID, or (None, None) if never probed"""
+        with self.lock:
+            i = self._find(doc_id)
+            if i < 0:
+                return None, None
+            return self.statuses[i], self.stamps[i] * self.resolution
+
+    def should_probe(self, doc_id, now=None):
+        """Whether an ID needs an HTTP request, given its last result and the miss TTL"""
+        status, probed_at = self.lookup(doc_id)
+        if status is None or status in (ERROR, UNVERIFIED):
+            return True
+        if status == FOUND:
+            return False
+        return (now or time.time()) - probed_at >= self.miss_ttl
+
+    def mark(self, doc_id, status, probed_at=None):
+        """Record the result of probing one ID"""
+        stamp = int((probed_at or time.time()) // self.resolution)
+        with self.lock:
+            if not self._apply(doc_id, status, stamp):
+                return
+            self.unsaved.append((doc_id, status, stamp))
+            should_save = len(self.unsaved) >= self.save_every
+
+        if should_save:
+            self.save()
+
+    def _apply(self, doc_id, status, stamp):
+        """Write one result into the runs; False if it was already recorded"""
+        i = self._find(doc_id)
+        if i >= 0:
+            if self.statuses[i] == status and self.stamps[i] == stamp:
+                return False
+            # Split the containing run around doc_id
+            start, end = self.starts[i], self.ends[i]
+            old_status, old_stamp = self.statuses[i], self.stamps[i]
+            self._delete(i)
+            pieces = []
+            if start < doc_id:
+                pieces.append((start, doc_id - 1, old_status, old_stamp))
+            pieces.append((doc_id, doc_id, status, stamp))
+            if doc_id < end:
+                pieces.append((doc_id + 1, end, old_status, old_stamp))
+            for offset, piece in enumerate(pieces):
+                self._insert(i + offset, *piece)
+            i += 1 if start < doc_id else 0
+        else:
+            i = bisect.bisect_right(self.starts, doc_id)
+            self._insert(i, doc_id, doc_id, status, stamp)
+
+        # Merge with neighbours that carry the same result
+        if i + 1 < len(self.starts) and self._mergeable(i, i + 1):
+            self.ends[i] = self.ends[i + 1]
+            self._delete(i + 1)
+        if i > 0 and self._mergeable(i - 1, i):
+            self.ends[i - 1] = self.ends[i]
+            self._delete(i)
+        return True
+
+    def _mergeable(self, left, right):
+        return (
+            self.ends[left] + 1 == self.starts[right]
+            and self.statuses[left] == self.statuses[right]
+            and self.stamps[left] == self.stamps[right]
+        )
+
+    def _insert(self, i, start, end, status, stamp):
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.statuses.insert(i, status)
+        self.stamps.insert(i, stamp)
+
+    def _delete(self, i):
+        del self.starts[i], self.ends[i], self.statuses[i], self.stamps[i]
+
+    def counts(self, start, end):
+        """Number of probed IDs per status within [start, end]"""
+        with self.lock:
+            counts = dict.fromkeys(STATUS_NAMES, 0)
+            i = max(bisect.bisect_right(self.starts, start) - 1, 0)
+            while i < len(self.starts) and self.starts[i] <= end:
+                overlap = min(self.ends[i], end) - max(self.starts[i], start) + 1
+                if overlap > 0:
+                    counts[self.statuses[i]] += overlap
+                i += 1
+        return counts
+
+    def highest(self, status):
+        """Highest ID recorded with this status, or None"""
+        with self.lock:
+            for i in range(len(self.starts) - 1, -1, -1):
+                if self.statuses[i] == status:
+                    return self.ends[i]
+        return None
+
+    def summary(self):
+        """Count of IDs per status name, plus the number of runs"""
+        with self.lock:
+            counts = {name: 0 for name in STATUS_NAMES.values()}
+            for start, end, status in zip(self.starts, self.ends, self.statuses):
+                counts[STATUS_NAMES[status]] += end - start + 1
+            counts["runs"] = len(self.starts)
+        return counts
@@ -0,0 +1,248 @@
+"""
+Rate Budget for ETD UGM Crawler
+Token bucket shared by the web app, the CLI crawler and the Telegram bot through one SQLite file,
+so every process together stays under the same requests-per-second cap
+"""
+
+import time
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RateBudget:
+    def __init__(self, path, rate=1.0, burst=1.0, name="etd"):
+        self.path = path
+        self.name = name
+        self.lock = threading.Lock()
+        self.waits = 0
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS bucket (
+                name TEXT PRIMARY KEY,
+                tokens REAL,
+                updated REAL,
+                rate REAL,
+                burst REAL
+            )
+        """)
+        try:
+            # Interactive lookups reserve the next token until this time; bulk crawling waits
+            self.conn.execute("ALTER TABLE bucket ADD COLUMN priority_until REAL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        # Back-offs by whichever process was throttled, so every status page can show them
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS backoffs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT,
+                reason TEXT
+            )
+        """)
+        # The configured rate only seeds a new bucket; an existing one keeps the rate other processes backed off to
+        self.conn.execute(
+            "INSERT OR IGNORE INTO bucket (name, tokens, updated, rate, burst) VALUES (?, ?, ?, ?, ?)",
+            (name, burst, time.time(), rate, burst),
+        )
+
+    def set_rate(self, rate, burst=None):
+        """Change the shared rate; every process picks it up on its next acquire()"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT burst FROM bucket WHERE name = ?", (self.name,)
+                ).fetchone()
+                if row is None:
+                    self.conn.execute(
+                        "INSERT INTO bucket (name, tokens, updated, rate, burst) VALUES (?, ?, ?, ?, ?)",
+                        (self.name, burst or 1.0, time.time(), rate, burst or 1.0),
+                    )
+                else:
+                    self.conn.execute(
+                        "UPDATE bucket SET rate = ?, burst = ? WHERE name = ?",
+                        (rate, burst if burst is not None else row[0], self.name),
+                    )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def record_backoff(self, reason, keep=20):
+        """Remember one back-off for every process's status page, keeping the latest `keep`"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute("INSERT INTO backoffs (name, reason) VALUES (?, ?)", (self.name, reason))
+                self.conn.execute(
+                    "DELETE FROM backoffs WHERE name = ? AND id NOT IN "
+                    "(SELECT id FROM backoffs WHERE name = ? ORDER BY id DESC LIMIT ?)",
+                    (self.name, self.name, keep),
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def recent_backoffs(self, limit=5):
+        """Latest back-offs from any process, oldest first"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT reason FROM backoffs WHERE name = ? ORDER BY id DESC LIMIT ?", (self.name, limit)
+            ).fetchall()
+        return [reason for reason, in reversed(rows)]
+
+    def _try_take(self, priority=False):
+        """Take one token if available; otherwise return seconds to wait"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                tokens, updated, rate, burst, priority_until = self.conn.execute(
+                    "SELECT tokens, updated, rate, burst, priority_until FROM bucket WHERE name = ?", (self.name,)
+                ).fetchone()
+                now = time.time()
+                tokens = min(burst, tokens + max(now - updated, 0) * rate)
+                if not priority and (priority_until or 0) > now:
+                    # Leave the next token for the waiting lookup, in whichever process it is
+                    wait = min(priority_until - now, 0.05)
+                elif tokens >= 1:
+                    tokens -= 1
+                    wait = 0.0
+                    if priority:
+                        priority_until = 0
+                else:
+                    wait = (1 - tokens) / rate
+                    if priority:
+                        # Expires on its own if this process dies while waiting
+                        priority_until = now + wait + 1.0
+                self.conn.execute(
+                    "UPDATE bucket SET tokens = ?, updated = ?, priority_until = ? WHERE name = ?",
+                    (tokens, now, priority_until, self.name)
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def acquire(self, priority=False):
+        """Block until this process may send one request; priority requests go ahead of bulk ones"""
+        waited = False
+        while True:
+            wait = self._try_take(priority)
+            if wait == 0:
+                if waited:
+                    with self.lock:
+                        self.waits += 1
+                return
+            waited = True
+            time.sleep(wait)
+
+    def status(self):
+        with self.lock:
+            rate, burst = self.conn.execute(
+                "SELECT rate, burst FROM bucket WHERE name = ?", (self.name,)
+            ).fetchone()
+            return {"rate": rate, "burst": burst, "waits": self.waits}
+
+
+class AdaptiveRateController:
+    """
+    AIMD control of the shared rate: multiplicative decrease on timeouts, 5xx, 429 or rising
+    latency, additive increase after a run of healthy responses, never above the ceiling
+    """
+
+    def __init__(self, budget, ceiling, floor=0.1, increase=0.1, decrease=0.5,
+                 healthy_run=20, latency_factor=2.0, cooldown=10.0, history=5):
+        self.budget = budget
+        self.increase = increase
+        self.decrease = decrease
+        self.healthy_run = healthy_run  # Healthy responses needed before each additive step
+        self.latency_factor = latency_factor  # Latency this many times the baseline counts as congestion
+        self.cooldown = cooldown  # Seconds between decreases, so one bad burst only halves once
+        self.history = history
+        self.lock = threading.Lock()
+        self.latency = None
+        self.baseline = None
+        self.samples = 0
+        self.healthy = 0
+        self.last_decrease = 0.0
+
+        # Live view for status pages; mutated in place
+        self.state = {
+            "rate": min(budget.status()["rate"], ceiling),
+            "ceiling": ceiling,
+            "floor": floor,
+            "latency_ms": None,
+            "backoffs": 0,
+            "recent_backoffs": [],
+        }
+        if self.state["rate"] != budget.status()["rate"]:
+            # Only ever lowers an existing rate to this process's ceiling
+            budget.set_rate(self.state["rate"])
+
+    def _congestion(self, latency, status_code, error):
+        """Reason to back off for this response, or None if it looked healthy"""
+        if error is not None:
+            return type(error).__name__
+        if status_code == 429:
+            return "HTTP 429 Too Many Requests"
+        if status_code is not None and status_code >= 500:
+            return f"HTTP {status_code}"
+        if latency is None:
+            return None
+
+        # Fast-moving average against a baseline that only creeps upwards slowly
+        self.samples += 1
+        self.latency = latency if self.latency is None else self.latency * 0.8 + latency * 0.2
+        if self.baseline is None or self.latency < self.baseline:
+            self.baseline = self.latency
+        else:
+            self.baseline += (self.latency - self.baseline) * 0.01
+        self.state["latency_ms"] = round(self.latency * 1000)
+
+        if self.samples >= 10 and self.latency > self.baseline * self.latency_factor:
+            return f"latency {self.latency * 1000:.0f} ms vs {self.baseline * 1000:.0f} ms baseline"
+        return None
+
+    def record(self, latency=None, status_code=None, error=None):
+        """Feed one request outcome into the controller"""
+        with self.lock:
+            reason = self._congestion(latency, status_code, error)
+            # Another process may have moved the shared rate since our last change
+            rate = self.budget.status()["rate"]
+            now = time.time()
+
+            if reason is not None:
+                self.healthy = 0
+                if now - self.last_decrease < self.cooldown or rate <= self.state["floor"]:
+                    return
+                self.last_decrease = now
+                new_rate = max(self.state["floor"], rate * self.decrease)
+                self.state["backoffs"] += 1
+                entry = f"{time.strftime('%H:%M:%S')} {reason}: {rate:.2f} -> {new_rate:.2f} req/s"
+                self.state["recent_backoffs"].append(entry)
+                del self.state["recent_backoffs"][:-self.history]
+                self.budget.record_backoff(entry)
+                logger.warning(f"Backing off: {reason} ({rate:.2f} -> {new_rate:.2f} req/s)")
+            else:
+                self.healthy += 1
+                if self.healthy < self.healthy_run:
+                    return
+                self.healthy = 0
+                new_rate = min(self.state["ceiling"], rate + self.increase)
+
+            if new_rate != rate:
+                self.budget.set_rate(new_rate)
+            self.state["rate"] = round(new_rate, 3)
+
+    def status(self):
+        """This process's view, with the shared rate and back-offs from every process"""
+        with self.lock:
+            state = dict(self.state)
+        state["rate"] = round(self.budget.status()["rate"], 3)
+        state["recent_backoffs"] = self.budget.recent_backoffs(self.history)
+        return state
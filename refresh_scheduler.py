@@ -0,0 +1,113 @@
+"""
+Refresh Scheduler for ETD UGM Crawler
+Keeps stored documents fresh: known IDs are re-checked with conditional, header-only
+requests, and a title is only extracted again when the file itself has changed
+"""
+
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Outcomes of refreshing one document
+UNCHANGED = "unchanged"
+CHANGED = "changed"
+GONE = "gone"
+FAILED = "failed"
+
+
+def conditional_headers(record):
+    """If-None-Match / If-Modified-Since built from the validators stored with a record"""
+    headers = {}
+    if record.get("etag"):
+        headers["If-None-Match"] = record["etag"]
+    if record.get("last_modified"):
+        headers["If-Modified-Since"] = record["last_modified"]
+    return headers
+
+
+def document_changed(record, validators):
+    """
+    Whether the file behind a record differs from what was parsed, judged by the strongest
+    validator both sides have: ETag, then Last-Modified, then size. None when there is
+    nothing to compare, i.e. the record predates validators.
+    """
+    for key in ("etag", "last_modified", "size"):
+        if record.get(key) is not None and validators.get(key) is not None:
+            return record[key] != validators[key]
+    return None
+
+
+class RefreshScheduler:
+    """
+    Re-validates stored documents in the background, stalest first, at a low fixed rate.
+    A record is due once its last check (or, if never checked, its crawl date) is older than max_age_days.
+    """
+
+    def __init__(self, refresh_one, records, max_age_days=30, seconds_per_check=5.0, idle_seconds=3600.0):
+        self.refresh_one = refresh_one  # refresh_one(doc_id) -> UNCHANGED, CHANGED, GONE or FAILED
+        self.records = records  # Record dicts keyed by string ID; read, never modified here
+        self.max_age = max_age_days * 86400
+        self.seconds_per_check = seconds_per_check
+        self.idle_seconds = idle_seconds  # Pause once nothing is due
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # Live view for status pages; mutated in place
+        self.state = {
+            "running": False,
+            "due": 0,
+            "checked": 0,
+            UNCHANGED: 0,
+            CHANGED: 0,
+            GONE: 0,
+            FAILED: 0,
+            "last_changed": None,
+        }
+
+    def due(self, now=None):
+        """IDs whose last check is older than max_age, stalest first"""
+        # Stored dates are "%Y-%m-%d %H:%M:%S", so they compare correctly as strings
+        cutoff = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime((now or time.time()) - self.max_age))
+        stale = []
+        for key, record in list(self.records.items()):
+            checked = record.get("checked") or record.get("date") or ""
+            if checked < cutoff:
+                stale.append((checked, key))
+        stale.sort()
+        return [int(key) for checked, key in stale]
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        self.state["running"] = True
+        try:
+            while not self.stop_event.is_set():
+                due = self.due()
+                self.state["due"] = len(due)
+                if not due:
+                    self.stop_event.wait(self.idle_seconds)
+                    continue
+                logger.info(f"Refreshing {len(due)} stored documents")
+                for doc_id in due:
+                    if self.stop_event.wait(self.seconds_per_check):
+                        break
+                    outcome = self.refresh_one(doc_id)
+                    self.state["checked"] += 1
+                    self.state["due"] -= 1
+                    self.state[outcome] += 1
+                    if outcome == CHANGED:
+                        self.state["last_changed"] = f"{doc_id} ({time.strftime('%Y-%m-%d %H:%M:%S')})"
+        except Exception as e:
+            logger.error(f"Refresh stopped: {e}")
+        finally:
+            self.state["running"] = False
@@ -0,0 +1,118 @@
+"""
+Response Cache for ETD UGM Crawler
+In-memory LRU of rendered pages keyed by (route, query, store version), served with an ETag
+so unchanged pages revalidate with a 304, and gzipped once rather than on every request
+"""
+
+import gzip
+import hashlib
+import functools
+import threading
+import logging
+from collections import OrderedDict
+from flask import Response, request
+
+logger = logging.getLogger(__name__)
+
+
+class CachedPage:
+    def __init__(self, body, mimetype, min_gzip_bytes):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        # Compressed once, up front; tiny bodies are not worth the header overhead
+        self.gzipped = gzip.compress(body, compresslevel=6) if len(body) >= min_gzip_bytes else None
+
+    @property
+    def size(self):
+        return len(self.body) + len(self.gzipped or b"")
+
+
+class ResponseCache:
+    """
+    Pages are only reused while the store version they were rendered at is current, so a commit
+    invalidates every cached page at once without the cache having to know what changed
+    """
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024, min_gzip_bytes=1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.min_gzip_bytes = min_gzip_bytes
+        self.lock = threading.Lock()
+        self.pages = OrderedDict()  # (route, query, version) -> CachedPage, least recently used first
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key):
+        with self.lock:
+            page = self.pages.get(key)
+            if page is None:
+                self.misses += 1
+                return None
+            self.pages.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, key, body, mimetype):
+        page = CachedPage(body, mimetype, self.min_gzip_bytes)
+        with self.lock:
+            old = self.pages.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
+            self.pages[key] = page
+            self.bytes += page.size
+            # Least recently used first; pages from older store versions are never hit again, so they age out first
+            while self.pages and (len(self.pages) > self.max_entries or self.bytes > self.max_bytes):
+                evicted_key, evicted = self.pages.popitem(last=False)
+                self.bytes -= evicted.size
+        return page
+
+    def respond(self, page):
+        """304 when the client already holds this representation, else the (gzipped if accepted) body"""
+        gzipped = page.gzipped is not None and request.accept_encodings["gzip"] > 0
+        # Each encoding is a different representation, so it gets its own strong ETag
+        etag = f"{page.etag}-gz" if gzipped else page.etag
+        headers = {
+            "ETag": f'"{etag}"',
+            "Vary": "Accept-Encoding",
+            "Cache-Control": "no-cache",  # Always revalidate; an unchanged page costs a 304
+        }
+        if request.if_none_match.contains_weak(etag):
+            with self.lock:
+                self.not_modified += 1
+            return Response(status=304, headers=headers)
+        if gzipped:
+            headers["Content-Encoding"] = "gzip"
+            return Response(page.gzipped, mimetype=page.mimetype, headers=headers)
+        return Response(page.body, mimetype=page.mimetype, headers=headers)
+
+    def cached(self, version):
+        """
+        Decorator for Flask views whose output depends only on the URL and the store.
+        version() returns the current store version, or None to bypass the cache.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                current = version()
+                if current is None:
+                    return view(*args, **kwargs)
+                key = (request.path, tuple(sorted(request.args.items(multi=True))), current)
+                page = self.get(key)
+                if page is None:
+                    response = view(*args, **kwargs)
+                    if not isinstance(response, Response):
+                        response = Response(response)
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    page = self.put(key, response.get_data(), response.mimetype)
+                return self.respond(page)
+            return wrapper
+        return decorator
+
+    def status(self):
+        with self.lock:
+            return {"entries": len(self.pages), "bytes": self.bytes, "hits": self.hits,
+                    "misses": self.misses, "not_modified": self.not_modified}
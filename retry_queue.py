@@ -0,0 +1,151 @@
+"""
+Retry Queue for ETD UGM Crawler
+Transient probe failures are retried with exponential backoff and jitter;
+IDs that exhaust their retries land in a dead-letter table for inspection and replay
+"""
+
+import time
+import random
+import sqlite3
+import threading
+import logging
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+def is_transient(error=None, status_code=None):
+    """Timeouts, connection resets and 429/5xx responses are worth retrying"""
+    if error is not None:
+        return isinstance(error, (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError))
+    return status_code == 429 or (status_code is not None and status_code >= 500)
+
+
+class RetryQueue:
+    def __init__(self, path, max_attempts=5, base_delay=2.0, max_delay=300.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.in_flight = set()  # Retries handed out and not yet resolved
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS retries (
+                doc_id INTEGER PRIMARY KEY,
+                job_id INTEGER,
+                attempts INTEGER NOT NULL,
+                next_at REAL NOT NULL,
+                last_error TEXT
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS dead_letters (
+                doc_id INTEGER PRIMARY KEY,
+                job_id INTEGER,
+                attempts INTEGER NOT NULL,
+                last_error TEXT,
+                failed_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def _delay(self, attempts):
+        # Exponential backoff with equal jitter, so retries from one outage do not arrive together
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def fail(self, doc_id, job_id, error, transient=True):
+        """Record a failed probe; returns "retry" or "dead" """
+        now = time.time()
+        with self.lock, self.conn:
+            self.in_flight.discard(doc_id)
+            row = self.conn.execute("SELECT attempts FROM retries WHERE doc_id = ?", (doc_id,)).fetchone()
+            attempts = (row["attempts"] if row else 0) + 1
+            if not transient or attempts >= self.max_attempts:
+                self.conn.execute("DELETE FROM retries WHERE doc_id = ?", (doc_id,))
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO dead_letters (doc_id, job_id, attempts, last_error, failed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (doc_id, job_id, attempts, str(error), now),
+                )
+                return "dead"
+            self.conn.execute(
+                "INSERT OR REPLACE INTO retries (doc_id, job_id, attempts, next_at, last_error) VALUES (?, ?, ?, ?, ?)",
+                (doc_id, job_id, attempts, now + self._delay(attempts), str(error)),
+            )
+        return "retry"
+
+    def succeeded(self, doc_id):
+        with self.lock, self.conn:
+            self.in_flight.discard(doc_id)
+            self.conn.execute("DELETE FROM retries WHERE doc_id = ?", (doc_id,))
+
+    def take_due(self, job_id, limit=100):
+        """IDs of this job whose backoff has elapsed; each is handed out once until resolved"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT doc_id FROM retries WHERE job_id = ? AND next_at <= ? ORDER BY next_at LIMIT ?",
+                (job_id, time.time(), limit + len(self.in_flight)),
+            ).fetchall()
+            due = [row["doc_id"] for row in rows if row["doc_id"] not in self.in_flight][:limit]
+            self.in_flight.update(due)
+        return due
+
+    def pending(self, job_id):
+        """(retries still outstanding for a job, seconds until the next one is due)"""
+        with self.lock:
+            count, next_at = self.conn.execute(
+                "SELECT COUNT(*), MIN(next_at) FROM retries WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return count, max((next_at or 0) - time.time(), 0)
+
+    def dead_letters(self, limit=50):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM dead_letters ORDER BY failed_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def counts(self):
+        with self.lock:
+            retrying = self.conn.execute("SELECT COUNT(*) FROM retries").fetchone()[0]
+            dead = self.conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+        return {"retrying": retrying, "dead": dead}
+
+    def replay(self, doc_ids=None):
+        """Move dead letters (all, or the given IDs) back to the retry table, unowned until adopt(); returns the IDs"""
+        with self.lock, self.conn:
+            if doc_ids is None:
+                rows = self.conn.execute("SELECT doc_id FROM dead_letters").fetchall()
+            else:
+                marks = ",".join("?" * len(doc_ids))
+                rows = self.conn.execute(
+                    f"SELECT doc_id FROM dead_letters WHERE doc_id IN ({marks})", list(doc_ids)
+                ).fetchall()
+            replayed = [row["doc_id"] for row in rows]
+            now = time.time()
+            for doc_id in replayed:
+                self.conn.execute("DELETE FROM dead_letters WHERE doc_id = ?", (doc_id,))
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO retries (doc_id, job_id, attempts, next_at, last_error) "
+                    "VALUES (?, NULL, 0, ?, 'replayed')",
+                    (doc_id, now),
+                )
+        return replayed
+
+    def adopt(self, job_id, active_job_ids=()):
+        """
+        Hand retries that no live job owns to job_id: replayed ones, and those left behind by
+        jobs that ended (failed, cancelled) before working through them
+        """
+        active = [job_id, *active_job_ids]
+        marks = ",".join("?" * len(active))
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"UPDATE retries SET job_id = ? WHERE job_id IS NULL OR job_id NOT IN ({marks})",
+                [job_id, *active],
+            )
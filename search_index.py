@@ -0,0 +1,288 @@
+"""
+Search Index for ETD UGM Crawler
+In-memory title indexes, so a search costs the size of its postings instead of a full scan:
+- BM25Index: word index over titles (and first-page text when a record has it) with BM25 ranking
+- TrigramIndex: trigram index for substring and typo-tolerant title matches
+"""
+
+import re
+import math
+import heapq
+import itertools
+import threading
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Common Indonesian function words; they appear in most titles and carry no meaning on their own
+STOP_WORDS = frozenset("""
+ada adalah agar akan antara atas atau bagai bagaimana bagi bahwa banyak beberapa belum berbagai
+bila dalam dan dapat dari daripada dengan di dia guna hal hanya harus hingga ia ini itu jika juga
+kami kita ke kepada ketika lain lebih maka masih melalui menjadi menurut mereka namun oleh pada
+para saat sangat satu secara sebagai sebuah sedang sehingga sejak selama seluruh semua sendiri
+serta setelah seperti suatu sudah tanpa telah tentang terhadap tersebut tetapi untuk yaitu yakni
+yang
+""".split())
+
+# The clitic "-nya" ("kinerjanya" -> "kinerja") is the only ending stripped. Particles and
+# possessives such as -lah, -ku and -mu also end plenty of root words (masalah, perilaku).
+SUFFIX = "nya"
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    """
+    Lowercase word tokens with stop words dropped and the clitic "-nya" stripped
+
+    >>> tokenize("Masalah sekolah, perilaku dan hukum yang berlaku")
+    ['masalah', 'sekolah', 'perilaku', 'hukum', 'berlaku']
+    >>> tokenize("Kinerjanya dan perilakunya")
+    ['kinerja', 'perilaku']
+    """
+    tokens = []
+    for word in TOKEN_PATTERN.findall(text.lower()):
+        if word in STOP_WORDS or len(word) < 2:
+            continue
+        if word.endswith(SUFFIX) and len(word) - len(SUFFIX) >= 4:
+            word = word[:-len(SUFFIX)]
+        tokens.append(word)
+    return tokens
+
+
+class BM25Index:
+    def __init__(self, records=(), k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        self.postings = {}  # term -> {doc_id: term frequency}
+        self.doc_terms = {}  # doc_id -> {term: frequency}, so a re-indexed record leaves its old postings
+        self.lengths = {}  # doc_id -> number of indexed tokens
+        self.total_length = 0
+        for record in records:
+            self.add(record)
+
+    def _text(self, record):
+        return " ".join(filter(None, (record.get("title"), record.get("text"))))
+
+    def add(self, record):
+        """Index a record, replacing whatever was indexed for its ID before"""
+        doc_id = int(record["id"])
+        terms = {}
+        for term in tokenize(self._text(record)):
+            terms[term] = terms.get(term, 0) + 1
+        with self.lock:
+            self._remove(doc_id)
+            self.doc_terms[doc_id] = terms
+            self.lengths[doc_id] = sum(terms.values())
+            self.total_length += self.lengths[doc_id]
+            for term, frequency in terms.items():
+                self.postings.setdefault(term, {})[doc_id] = frequency
+
+    def _remove(self, doc_id):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.lengths.pop(doc_id)
+        for term in terms:
+            postings = self.postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self.postings[term]
+
+    def search(self, query, limit=None):
+        """(doc_id, score) pairs for records matching any query term, best first"""
+        terms = set(tokenize(query))
+        with self.lock:
+            count = len(self.doc_terms)
+            if not terms or not count:
+                return []
+            average_length = self.total_length / count or 1
+            scores = {}
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit else ranked
+
+
+def normalize(text):
+    """Lowercase words separated by single spaces, the form substring queries are matched in"""
+    return " ".join(TOKEN_PATTERN.findall(text.lower()))
+
+
+def trigrams(word):
+    """Distinct trigrams of a word, padded so its start and end count too"""
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    Substring and typo-tolerant title search. Trigrams index the vocabulary of title words, not
+    the titles themselves, and word -> IDs postings do the rest: a query first resolves each word
+    against the (small) vocabulary, then intersects ID sets, so the cost follows the number of
+    matching titles rather than how common the query's letters are.
+    """
+
+    def __init__(self, records=()):
+        self.lock = threading.Lock()
+        self.texts = {}  # ID -> normalized title
+        self.ids = {}  # word -> set of IDs whose title has it
+        self.words = {}  # trigram -> set of vocabulary words having it
+        self.sorted_ids = {}  # word -> ascending IDs, built on demand
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        """Index a record's title, replacing whatever was indexed for its ID before"""
+        doc_id = int(record["id"])
+        text = normalize(record.get("title") or "")
+        with self.lock:
+            old = self.texts.pop(doc_id, None)
+            if old is not None:
+                for word in set(old.split()):
+                    self.sorted_ids.pop(word, None)
+                    ids = self.ids[word]
+                    ids.discard(doc_id)
+                    if not ids:
+                        del self.ids[word]
+                        for gram in trigrams(word):
+                            self.words[gram].discard(word)
+            self.texts[doc_id] = text
+            for word in set(text.split()):
+                self.sorted_ids.pop(word, None)
+                if word not in self.ids:
+                    self.ids[word] = set()
+                    for gram in trigrams(word):
+                        self.words.setdefault(gram, set()).add(word)
+                self.ids[word].add(doc_id)
+
+    def _containing(self, fragment, test, anchor="start"):
+        """
+        Vocabulary words for which test(word) holds, narrowed by the fragment's trigrams first.
+        One or two letters are too short for inner trigrams, so they only match at the word's
+        start (or, with anchor="end", its end), which the padded trigrams index.
+        """
+        grams = {fragment[i:i + 3] for i in range(len(fragment) - 2)}
+        if grams:
+            lists = sorted((self.words.get(gram, set()) for gram in grams), key=len)
+            vocabulary = lists[0].intersection(*lists[1:])
+        else:
+            # Only the trigram keys are scanned, never the whole vocabulary
+            if anchor == "end":
+                edges = [words for gram, words in self.words.items() if gram.endswith(f"{fragment} ")]
+            else:
+                edges = [words for gram, words in self.words.items() if gram.startswith(f" {fragment}")]
+            vocabulary = set().union(*edges)
+        return [word for word in vocabulary if test(word)]
+
+    def _similar(self, word, threshold):
+        """Vocabulary word -> fraction of this word's trigrams it shares, for those reaching threshold"""
+        grams = trigrams(word)
+        needed = max(1, math.ceil(threshold * len(grams)))
+        hits = Counter()
+        for gram in grams:
+            hits.update(self.words.get(gram, ()))
+        return {other: count / len(grams) for other, count in hits.items() if count >= needed}
+
+    def _sorted(self, word):
+        """IDs for a word in ascending order, cached until the word's postings change"""
+        ids = self.sorted_ids.get(word)
+        if ids is None:
+            ids = self.sorted_ids[word] = sorted(self.ids[word])
+        return ids
+
+    def _matching(self, groups):
+        """
+        IDs having, for every group, at least one of its words. Only the smallest group is
+        unioned in full; the others just narrow it down with intersections.
+        """
+        groups = sorted(groups, key=lambda words: sum(len(self.ids[word]) for word in words))
+        candidates = self._union(groups[0])
+        for words in groups[1:]:
+            if not candidates:
+                break
+            candidates = set().union(*(candidates.intersection(self.ids[word]) for word in words))
+        return candidates
+
+    def _union(self, words):
+        return set().union(*(self.ids[word] for word in words))
+
+    def _closest(self, scores, exclude, limit):
+        """
+        (doc_id, score) for a one-word query, best first: look-alike words are read from the
+        closest down, merging their sorted IDs only until limit titles are found
+        """
+        levels = {}
+        for other, score in scores.items():
+            levels.setdefault(score, []).append(other)
+        seen = set(exclude)
+        ranked = []
+        for score in sorted(levels, reverse=True):
+            merged = heapq.merge(*(self._sorted(word) for word in levels[score]))
+            for doc_id, _ in itertools.groupby(merged):
+                if doc_id not in seen:
+                    seen.add(doc_id)
+                    ranked.append((doc_id, score))
+                    if len(ranked) == limit:
+                        return ranked
+        return ranked
+
+    def search(self, query, threshold=0.6, limit=None):
+        """
+        (doc_id, score) pairs, best first. Titles containing the query verbatim score 1.0 and come
+        first, lowest ID first; then titles in which every query word has a look-alike, scored by the
+        average fraction of trigrams shared, if each word reaches threshold. A query word of one or
+        two letters only matches the start of a title word. Pass a limit: without one every match
+        is built and scored.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        words = query.split()
+        with self.lock:
+            exact = []
+            if len(words) == 1:
+                matches = self._containing(query, lambda word: query in word)
+                if limit:
+                    # Merging the per-word sorted IDs reads only as far as the limit
+                    merged = heapq.merge(*(self._sorted(word) for word in matches))
+                    exact = [(doc_id, 1.0) for doc_id, _ in itertools.islice(itertools.groupby(merged), limit)]
+                    if len(exact) == limit:
+                        return exact
+                else:
+                    exact = [(doc_id, 1.0) for doc_id in sorted(self._union(matches))]
+            else:
+                # The first word may end a title word, the last may start one, the rest are whole words
+                first, last = words[0], words[-1]
+                groups = [self._containing(first, lambda word: word.endswith(first), anchor="end"),
+                          self._containing(last, lambda word: word.startswith(last))]
+                groups += [[word] if word in self.ids else [] for word in words[1:-1]]
+                for doc_id in sorted(self._matching(groups)):
+                    if query in self.texts[doc_id]:
+                        exact.append((doc_id, 1.0))
+                        if limit and len(exact) == limit:
+                            return exact
+
+            similar = [self._similar(word, threshold) for word in words]
+            if len(words) == 1 and limit:
+                return exact + self._closest(similar[0], (doc_id for doc_id, score in exact), limit - len(exact))
+            candidates = self._matching(similar).difference(doc_id for doc_id, score in exact)
+            totals = dict.fromkeys(candidates, 0.0)
+            for scores in similar:
+                best = {}
+                for other, score in sorted(scores.items(), key=lambda item: item[1]):
+                    best.update(dict.fromkeys(self.ids[other].intersection(candidates), score))  # Higher overwrites
+                for doc_id, score in best.items():
+                    totals[doc_id] += score
+        fuzzy = sorted(((doc_id, total / len(words)) for doc_id, total in totals.items()),
+                       key=lambda item: (-item[1], item[0]))
+        ranked = exact + fuzzy
+        return ranked[:limit] if limit else ranked
@@ -1,13 +1,24 @@
 import os
-import json
 import time
-import requests
+import asyncio
+import functools
 import fitz  # PyMuPDF
 from datetime import datetime
-import threading
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
 import logging
+from crawl_store import open_crawl_store, HashIndex
+from search_index import TrigramIndex
+from crawler_client import CrawlerClient, SessionBreaker, document_validators, is_login_redirect
+from crawl_pipeline import CrawlPipeline, crawl_concurrently
+from rate_budget import RateBudget, AdaptiveRateController
+from probe_state import ProbeMap, status_for_response, ERROR, FOUND
+from crawl_jobs import CrawlJobs, CrawlCursor, CrawlQueue
+from id_scheduler import DensityScheduler, Follower
+from retry_queue import RetryQueue, is_transient
+from title_cache import TitleCache
+from document_lookup import SingleFlight, is_fresh
+from refresh_scheduler import RefreshScheduler, conditional_headers, document_changed, UNCHANGED, CHANGED, GONE, FAILED
 
 # Enable logging
 logging.basicConfig(
@@ -22,36 +33,161 @@ BASE_URL = "http://etd.intranet.lib.ugm/home/detail_pencarian_downloadfiles/"
 SESSION_COOKIE = "98bd8iuo8b0ifo9vsneg5b30cd3gtgjv"
 
 # Database to store crawled PDFs
-CRAWL_DB_FILE = "crawled_pdfs.json"
+CRAWL_DB_FILE = "crawled_pdfs.json"  # Legacy file, migrated once into the store
+CRAWL_STORE_FILE = "crawled_pdfs.db"
+CRAWL_STORE_MODE = "sqlite"  # "sqlite" or "journal" (JSON snapshot + append-only journal)
+CRAWL_JOURNAL_FILE = "crawled_pdfs.journal.jsonl"
+PROBE_STATE_FILE = "probe_state.db"  # Shared by every process
+LEGACY_PROBE_STATE_FILE = "probe_state.json"  # Legacy file, migrated once into PROBE_STATE_FILE
+PROBE_MISS_TTL_DAYS = 30  # Re-check IDs that had no attachment after this many days
+crawl_store = None
+probe_map = None
+TITLE_PREFIX_BYTES = 256 * 1024  # Titles are parsed from this much of each PDF before a full download
+TITLE_PLACEHOLDERS = ("Unknown Title", "Error Extracting Title")
+PDF_SPILL_BYTES = 64 * 1024 * 1024  # Full downloads larger than this are parsed from a temp file
+PARSE_WORKERS = 2  # Processes running extract_pdf_title
+PRIORITY_PARSE_WORKERS = 1  # Processes parsing for interactive lookups, apart from the crawl
+PARSE_QUEUE_DEPTH = 8  # Hits waiting to be parsed before fetching pauses (backpressure)
+TITLE_CACHE_FILE = "title_cache.db"  # Titles by prefix hash and size, shared by every process
+TITLE_CACHE_MAX_ENTRIES = 100000
+TITLE_EXTRACTOR_VERSION = "pymupdf-1"  # Bump when extract_pdf_title changes; titles cached by older versions are ignored
+CRAWL_CONCURRENCY = 3  # Probes in flight at once; they still share the rate budget below
+REQUESTS_PER_SECOND = 1.0  # Starting rate shared by the web app, the CLI crawler and the bot
+MAX_REQUESTS_PER_SECOND = 3.0  # The adaptive controller never goes above this
+MIN_REQUESTS_PER_SECOND = 0.1
+RATE_BUDGET_FILE = "crawl_budget.db"
+CRAWL_JOBS_FILE = "crawl_jobs.db"
+CRAWL_JOB_OWNER = "telegram_bot"  # Each script resumes only the jobs it started
+CHECKPOINT_SECONDS = 5  # How often a running crawl commits its cursor
+DENSITY_BLOCK_SIZE = 1000  # Density crawls estimate hits per block of this many IDs
+DENSITY_SAMPLES_PER_BLOCK = 16  # Probes spent on each block before blocks are ranked
+MIN_BLOCK_DENSITY = 0.0  # Raise to skip blocks whose estimated hit rate is below this
+scheduler = None
+FOLLOW_START_ID = 1000000  # Follow mode starts discovery here when nothing has been found yet
+FOLLOW_LOOKAHEAD = 50  # IDs past the high-water mark checked on every sweep
+FOLLOW_SECONDS_PER_PROBE = 5  # Fixed, low probe rate while following
+FOLLOW_IDLE_SECONDS = 300  # Pause after a sweep that found nothing new
+follower = None
+RETRY_MAX_ATTEMPTS = 5  # Transient failures are tried this many times before they are dead-lettered
+RETRY_BASE_DELAY = 2  # Seconds before the first retry; doubles per attempt, with jitter
+RETRY_MAX_DELAY = 300
+retry_queue = None
+SESSION_COOKIE_FILE = "session_cookie.txt"  # Overrides SESSION_COOKIE when present; every process re-reads it
+AUTH_FAILURE_THRESHOLD = 5  # Consecutive login redirects before crawling pauses for a new cookie
+SESSION_POLL_SECONDS = 10  # How often a paused crawl looks for a renewed cookie
+REFRESH_MAX_AGE_DAYS = 30  # Stored documents are re-validated once their last check is this old
+REFRESH_SECONDS_PER_CHECK = 5  # Fixed, low rate of conditional requests while refreshing
+REFRESH_IDLE_SECONDS = 3600  # Pause once every stored document is fresh
+refresher = None
+LOOKUP_MAX_AGE_DAYS = 30  # ID lookups answer from the store when the record was checked this recently
+lookups = SingleFlight()  # Concurrent lookups of one ID share a single upstream fetch
+FIND_RESULT_LIMIT = 10  # Titles listed per /find
+ALERT_CHAT_IDS = []  # Chats that always receive crawler alerts; chats that use /crawl, /cookie or /follow are remembered too
+ALERT_POLL_SECONDS = 30
+crawl_jobs = None
+crawl_queue = None
+client = CrawlerClient(BASE_URL, SESSION_COOKIE, prefix_bytes=TITLE_PREFIX_BYTES, pool_size=CRAWL_CONCURRENCY + 1)
 crawled_pdfs = {}
+hash_index = HashIndex()  # (Prefix hash, size) -> IDs, for spotting the same file under several IDs
+title_index = TrigramIndex()  # Title word trigrams -> words -> IDs, for /find
 crawl_status = {
     "is_running": False,
     "current_id": 0,
     "total_found": 0,
     "start_time": 0,
-    "end_id": 0
+    "end_id": 0,
+    "job_id": None,
+    "rate_control": {}  # Live view of the adaptive rate controller
 }
 
 def load_crawl_database():
-    global crawled_pdfs
-    if os.path.exists(CRAWL_DB_FILE):
-        try:
-            with open(CRAWL_DB_FILE, 'r', encoding='utf-8') as f:
-                crawled_pdfs = json.load(f)
-            logger.info(f"Loaded {len(crawled_pdfs)} entries from database")
-        except Exception as e:
-            logger.error(f"Error loading database: {e}")
-            crawled_pdfs = {}
-    else:
-        crawled_pdfs = {}
+    global crawled_pdfs, crawl_store, probe_map, crawl_jobs, crawl_queue, scheduler, follower, retry_queue, refresher, hash_index, title_index
+    probe_map = ProbeMap(PROBE_STATE_FILE, miss_ttl_days=PROBE_MISS_TTL_DAYS, legacy_path=LEGACY_PROBE_STATE_FILE)
+    scheduler = DensityScheduler(probe_map, block_size=DENSITY_BLOCK_SIZE,
+                                 samples_per_block=DENSITY_SAMPLES_PER_BLOCK, min_density=MIN_BLOCK_DENSITY)
+    follower = Follower(follow_probe, probe_map, FOLLOW_START_ID, lookahead=FOLLOW_LOOKAHEAD,
+                        seconds_per_probe=FOLLOW_SECONDS_PER_PROBE, idle_seconds=FOLLOW_IDLE_SECONDS)
+    crawl_jobs = CrawlJobs(CRAWL_JOBS_FILE)
+    crawl_queue = CrawlQueue(crawl_jobs, CRAWL_JOB_OWNER, run_crawl_job)
+    retry_queue = RetryQueue(CRAWL_JOBS_FILE, max_attempts=RETRY_MAX_ATTEMPTS,
+                             base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY)
+    pipeline.title_cache = TitleCache(TITLE_CACHE_FILE, TITLE_EXTRACTOR_VERSION, max_entries=TITLE_CACHE_MAX_ENTRIES)
+    client.set_session_cookie(current_session_cookie())
+    client.breaker = SessionBreaker(client, threshold=AUTH_FAILURE_THRESHOLD, on_trip=session_expired)
+    client.budget = RateBudget(RATE_BUDGET_FILE, rate=REQUESTS_PER_SECOND)
+    client.rate_controller = AdaptiveRateController(client.budget, ceiling=MAX_REQUESTS_PER_SECOND,
+                                                    floor=MIN_REQUESTS_PER_SECOND)
+    crawl_status["rate_control"] = client.rate_controller.state
+    try:
+        crawl_store = open_crawl_store(CRAWL_STORE_MODE, CRAWL_STORE_FILE, CRAWL_DB_FILE, CRAWL_JOURNAL_FILE)
+        crawl_store.migrate_json(CRAWL_DB_FILE)
+        crawled_pdfs = crawl_store.load_all()
+        hash_index = HashIndex(crawled_pdfs.values())
+        title_index = TrigramIndex(crawled_pdfs.values())
+        logger.info(f"Loaded {len(crawled_pdfs)} entries from database")
+        seed_probe_state()
+    except Exception as e:
+        # Serving and crawling without the store would lose every hit, so refuse to start
+        raise SystemExit(f"Error loading database: {e}")
+    refresher = RefreshScheduler(refresh_document, crawled_pdfs, max_age_days=REFRESH_MAX_AGE_DAYS,
+                                 seconds_per_check=REFRESH_SECONDS_PER_CHECK, idle_seconds=REFRESH_IDLE_SECONDS)
+
+def current_session_cookie():
+    """The cookie file, when present, overrides SESSION_COOKIE so a session can be renewed without a restart"""
+    try:
+        with open(SESSION_COOKIE_FILE, 'r', encoding='utf-8') as f:
+            return f.read().strip() or SESSION_COOKIE
+    except FileNotFoundError:
+        return SESSION_COOKIE
+
+def update_session_cookie(session_cookie):
+    """Save a renewed cookie for every process and close this process's breaker"""
+    session_cookie = session_cookie.strip()
+    with open(SESSION_COOKIE_FILE, 'w', encoding='utf-8') as f:
+        f.write(session_cookie)
+    if not client.breaker.try_reset(session_cookie):
+        client.set_session_cookie(session_cookie)
+
+def session_expired():
+    """Breaker callback: alert through the bot; the crawl pauses itself"""
+    logger.warning("Session cookie expired; crawling paused until it is updated")
+    crawl_jobs.alert(f"🔐 Sesi ETD kedaluwarsa ({CRAWL_JOB_OWNER}). Crawling dijeda sampai cookie diperbarui dengan /cookie [nilai] atau di {SESSION_COOKIE_FILE}.")
 
-def save_crawl_database():
-    with open(CRAWL_DB_FILE, 'w', encoding='utf-8') as f:
-        json.dump(crawled_pdfs, f, ensure_ascii=False, indent=2)
+def wait_for_session(should_stop=lambda: False):
+    """Block while the breaker is open, picking up a renewed cookie from the cookie file"""
+    while client.breaker.tripped and not should_stop():
+        time.sleep(SESSION_POLL_SECONDS)
+        client.breaker.try_reset(current_session_cookie())
 
-def extract_pdf_title(pdf_path):
+def seed_probe_state():
+    # Records stored before probe state existed (e.g. the JSON migration) count as found,
+    # so the crawl skip check can rely on the probe state alone
+    unseeded = [int(key) for key in crawled_pdfs if key.isdigit() and probe_map.lookup(int(key))[0] != FOUND]
+    for doc_id in unseeded:
+        probe_map.mark(doc_id, FOUND)
+    if unseeded:
+        probe_map.save()
+        logger.info(f"Marked {len(unseeded)} stored documents as found in the probe state")
+
+def index_record(record):
+    """Hold a record in memory and in every in-memory index"""
+    crawled_pdfs[str(record["id"])] = record
+    hash_index.add(record)
+    title_index.add(record)
+
+def save_crawl_database(record):
+    # Single-row upsert (or one journal append); cost does not grow with the database
+    index_record(record)
+    if crawl_store is not None:
+        crawl_store.upsert(record)
+
+def extract_pdf_title(pdf_source):
+    """Extract a title from PDF bytes or a buffer (parsed in memory) or a file path"""
     try:
-        doc = fitz.open(pdf_path)
+        if isinstance(pdf_source, (str, os.PathLike)):
+            doc = fitz.open(pdf_source)
+        else:
+            doc = fitz.open(stream=pdf_source, filetype="pdf")
         first_page = doc.load_page(0)
         
         # Try getting text in blocks which might preserve formatting better
@@ -87,145 +223,347 @@ def extract_pdf_title(pdf_path):
         logger.error(f"Error extracting title: {e}")
         return "Error Extracting Title"
 
-def search_pdf_by_id(doc_id):
-    """Search for a PDF by document ID"""
+def known_title(key):
+    """Title already extracted from the same file (same prefix hash and size) under another ID, or None"""
+    for doc_id in hash_index.lookup(key):
+        title = crawled_pdfs.get(str(doc_id), {}).get("title")
+        if title and title not in TITLE_PLACEHOLDERS:
+            return title
+    return None
+
+# Fetch/parse pipeline: the crawl thread fetches, a process pool runs extract_pdf_title
+pipeline = CrawlPipeline(client, extract_pdf_title, parse_workers=PARSE_WORKERS, priority_workers=PRIORITY_PARSE_WORKERS,
+                         queue_depth=PARSE_QUEUE_DEPTH, placeholders=TITLE_PLACEHOLDERS,
+                         spill_bytes=PDF_SPILL_BYTES, known_title=known_title)
+
+def store_found_document(doc_id, filename, title, bytes_transferred, content=None, progress_callback=None, cursor=None, validators=None):
+    """Store a parsed hit; runs on the pipeline's finisher thread"""
+    save_crawl_database({
+        "id": doc_id,
+        "filename": filename,
+        "title": title,
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "direct_url": client.url_for(doc_id),
+        "bytes_transferred": bytes_transferred,
+        **(validators or {}),
+        **(content or {})
+    })
+    
+    # Mark after the record is stored so a crash never hides a hit
+    probe_map.mark(doc_id, FOUND)
+    crawl_status["total_found"] += 1
+    if cursor is not None:
+        cursor.finish(doc_id)
+    
+    # Call progress callback if provided
+    if progress_callback:
+        progress_callback(doc_id, crawl_status["total_found"], title)
+    
+    logger.info(f"Found document {doc_id}: {title}")
+
+def stored_result(record, source):
+    """Lookup result for a stored record; source is "store" or "server" """
+    return {
+        "found": True,
+        "filename": record["filename"],
+        "title": record["title"],
+        "download_url": client.url_for(record["id"]),
+        "size": record.get("size"),
+        "source": source,
+        "checked": record.get("checked") or record.get("date"),
+    }
+
+def search_pdf_by_id(doc_id, refresh=False):
+    """Search for a PDF by document ID; a fresh stored record is answered without any request unless refresh is set"""
+    known = crawled_pdfs.get(str(doc_id))
+    if known is None and crawl_store is not None and str(doc_id).isdigit():
+        # Another process sharing the store may have found it since this one loaded
+        known = crawl_store.get(int(doc_id))
+        if known is not None:
+            index_record(known)
+    if known is not None and not refresh and is_fresh(known, LOOKUP_MAX_AGE_DAYS):
+        return stored_result(known, "store")
     try:
-        headers = {'Cookie': f'ugmfw_session={SESSION_COOKIE}'}
-        url = f"{BASE_URL}{doc_id}"
-        r = requests.get(url, headers=headers, timeout=10)
-        
-        if 'attachment; filename=' in r.headers.get('Content-Disposition', ''):
-            filename = r.headers['Content-Disposition'].split('filename=')[1].strip('"')
-            
-            # Create a temporary directory
-            temp_dir = os.path.join("temp_downloads")
-            os.makedirs(temp_dir, exist_ok=True)
-            temp_path = os.path.join(temp_dir, filename)
-            
-            # Temporarily save for title extraction
-            with open(temp_path, 'wb') as f:
-                f.write(r.content)
-            
-            # Extract PDF title
-            title = extract_pdf_title(temp_path)
-            
-            # Delete the file after getting the title
-            try:
-                os.remove(temp_path)
-            except Exception as e:
-                logger.error(f"Error deleting temporary file: {e}")
-            
-            # Try to remove temp directory if empty
-            try:
-                os.rmdir(temp_dir)
-            except:
-                pass
-            
-            # Store in our database
-            crawled_pdfs[str(doc_id)] = {
-                "id": doc_id,
-                "filename": filename,
-                "title": title,
-                "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "direct_url": url
-            }
-            save_crawl_database()
-            
-            return {
-                "found": True,
-                "filename": filename,
-                "title": title,
-                "download_url": url,
-                "size": len(r.content)
-            }
-        else:
-            return {"found": False, "message": "No PDF found or access denied"}
+        return lookups.do(str(doc_id), functools.partial(fetch_pdf_by_id, doc_id))
     except Exception as e:
         return {"found": False, "message": f"Error: {str(e)}"}
 
-def crawl_pdfs(start_id, end_id, progress_callback=None):
+def fetch_pdf_by_id(doc_id):
+    """Ask the server about one ID; interactive lookups go ahead of any running crawl in the rate budget and parse queue"""
+    if str(doc_id) in crawled_pdfs:
+        # A known ID is re-validated with a conditional request; the title is only re-extracted if the file changed
+        outcome = refresh_document(int(doc_id), priority=True)
+        if outcome in (UNCHANGED, CHANGED):
+            return stored_result(crawled_pdfs[str(doc_id)], "server")
+        if outcome == GONE:
+            return {"found": False, "message": "No PDF found or access denied"}
+        # The check already spent this lookup's request; answer from the store rather than probing again
+        return stored_result(crawled_pdfs[str(doc_id)], "store")
+    
+    r, filename = client.probe(doc_id, priority=True)
+    has_attachment = filename is not None
+    login_redirect = not has_attachment and is_login_redirect(r)
+    
+    # Let the crawler skip this ID too
+    if probe_map is not None and str(doc_id).isdigit():
+        probe_map.mark(int(doc_id), status_for_response(r.status_code, has_attachment, login_redirect))
+        try:
+            # One mark per lookup would otherwise wait in memory for the autosave threshold
+            probe_map.save()
+        except Exception as e:
+            logger.error(f"Error saving probe state: {e}")
+    
+    if has_attachment:
+        # Parse the title from a bounded prefix of the download
+        title, bytes_transferred, content = pipeline.extract_from_response(r, doc_id, priority=True)
+        record = {
+            "id": int(doc_id),
+            "filename": filename,
+            "title": title,
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "direct_url": client.url_for(doc_id),
+            "bytes_transferred": bytes_transferred,
+            **document_validators(r),
+            **content
+        }
+        # Store in our database
+        save_crawl_database(record)
+        return stored_result(record, "server")
+    elif login_redirect:
+        return {"found": False, "login_redirect": True, "message": "Sesi kedaluwarsa, server meminta login. Perbarui cookie dengan /cookie [nilai]"}
+    else:
+        return {"found": False, "message": "No PDF found or access denied"}
+
+def follow_probe(doc_id):
+    """Probe one ID for follow mode; a hit is parsed and stored right away"""
+    try:
+        wait_for_session(follower.stop_event.is_set)
+        # Misses are re-probed here regardless of their TTL, since new uploads fill them in
+        r, filename = client.probe(doc_id)
+        if filename is None:
+            probe_map.mark(doc_id, status_for_response(r.status_code, False, is_login_redirect(r)))
+            return False
+        title, bytes_transferred, content = pipeline.extract_from_response(r, doc_id)
+        save_crawl_database({
+            "id": doc_id,
+            "filename": filename,
+            "title": title,
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "direct_url": client.url_for(doc_id),
+            "bytes_transferred": bytes_transferred,
+            **document_validators(r),
+            **content
+        })
+        probe_map.mark(doc_id, FOUND)
+        logger.info(f"New upload {doc_id}: {title}")
+        return True
+    except Exception as e:
+        probe_map.mark(doc_id, ERROR)
+        logger.error(f"Error following document {doc_id}: {e}")
+        return False
+
+def refresh_document(doc_id, priority=False):
+    """Re-validate one stored document with a conditional request; the title is only extracted again if the file changed"""
+    record = crawled_pdfs.get(str(doc_id))
+    if record is None:
+        return GONE
+    try:
+        if not priority:
+            # Interactive lookups report an expired session instead of waiting for a new cookie
+            wait_for_session(refresher.stop_event.is_set)
+        r, filename = client.probe(doc_id, headers=conditional_headers(record), priority=priority)
+        checked = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if r.status_code == 304:
+            save_crawl_database(dict(record, checked=checked))
+            return UNCHANGED
+        if filename is None:
+            if is_login_redirect(r) or is_transient(status_code=r.status_code):
+                return FAILED
+            # Keep the record; only note that the attachment was missing at this check
+            save_crawl_database(dict(record, checked=checked))
+            logger.info(f"Stored document {doc_id} no longer has an attachment")
+            return GONE
+        
+        validators = document_validators(r)
+        if not document_changed(record, validators) and filename == record.get("filename"):
+            # Same file (or the first check of a record stored without validators): keep its title
+            client.release(r)
+            save_crawl_database(dict(record, checked=checked, **validators))
+            return UNCHANGED
+        
+        title, bytes_transferred, content = pipeline.extract_from_response(r, doc_id, priority=priority)
+        save_crawl_database({**record, **validators, **content, "filename": filename, "title": title,
+                             "checked": checked, "bytes_transferred": bytes_transferred})
+        logger.info(f"Document {doc_id} changed, new title: {title}")
+        return CHANGED
+    except Exception as e:
+        logger.error(f"Error refreshing document {doc_id}: {e}")
+        return FAILED
+
+def crawl_pdfs(start_id, end_id, progress_callback=None, job=None):
     """Crawl PDFs in a range of IDs"""
     global crawl_status
     
+    # A new crawl is persisted as a job; a resumed one continues after its last committed ID
+    if job is None:
+        job = crawl_jobs.create(start_id, end_id, CRAWL_JOB_OWNER)
+    # Density and retry jobs visit IDs out of order, so they always restart from the top of
+    # their range and rely on the probe state and retry table to skip what was already done
+    linear = job["strategy"] == "linear"
+    cursor = CrawlCursor(job["cursor"] + 1 if linear else job["start_id"], checkpoint_seconds=CHECKPOINT_SECONDS)
+    requests_before = client.requests_made
+    found_before = job["found"]
+    
+    # Retries that no live job owns (replayed, or left by a job that failed or was cancelled) are this job's
+    retry_queue.adopt(job["id"], crawl_jobs.active_ids())
+    
     crawl_status["is_running"] = True
-    crawl_status["current_id"] = start_id
-    crawl_status["total_found"] = 0
+    crawl_status["current_id"] = cursor.start_id
+    crawl_status["total_found"] = job["found"]
     crawl_status["start_time"] = time.time()
     crawl_status["end_id"] = end_id
+    crawl_status["job_id"] = job["id"]
     
-    headers = {'Cookie': f'ugmfw_session={SESSION_COOKIE}'}
+    def checkpoint():
+        # Probe state first, so every ID up to the committed cursor is on disk before the cursor is
+        probe_map.save()
+        position = cursor.position() if linear else job["start_id"] - 1
+        return crawl_jobs.checkpoint(job["id"], position, crawl_status["total_found"])
     
-    for doc_id in range(start_id, end_id + 1):
-        # Update current ID in status
-        crawl_status["current_id"] = doc_id
-        
-        # Skip if already crawled
-        if str(doc_id) in crawled_pdfs:
-            continue
+    def pause_while_expired():
+        # Hold the job while the session breaker is open; False if it was cancelled meanwhile
+        if not client.breaker.tripped:
+            return True
+        crawl_jobs.set_status(job["id"], "paused")
+        logger.warning(f"Crawl job {job['id']} paused: session expired")
+        wait_for_session(lambda: not checkpoint())
+        crawl_jobs.set_status(job["id"], "running")
+        return not crawl_jobs.is_cancelled(job["id"])
+    
+    next_retry_check = [0]
+    
+    def due_retries():
+        # Retries whose backoff has elapsed, checked about once a second
+        if time.time() < next_retry_check[0]:
+            return []
+        next_retry_check[0] = time.time() + 1
+        due = retry_queue.take_due(job["id"])
+        for doc_id in due:
+            cursor.retry(doc_id)
+        return due
+    
+    def pending_ids():
+        if linear:
+            doc_ids = range(cursor.start_id, end_id + 1)
+        elif job["strategy"] == "density":
+            doc_ids = scheduler.ordered_ids(cursor.start_id, end_id)
+        else:
+            # Replay jobs only work through the dead letters handed back to the retry queue
+            doc_ids = ()
+        for doc_id in doc_ids:
+            # Update current ID in status
+            crawl_status["current_id"] = doc_id
+            if cursor.checkpoint_due():
+                checkpoint()
+            if crawl_jobs.is_cancelled(job["id"]) or not pause_while_expired():
+                return
+            yield from due_retries()
             
+            # Skip hits and IDs probed recently without a hit
+            if not probe_map.should_probe(doc_id):
+                cursor.skip(doc_id)
+                continue
+            cursor.start(doc_id)
+            yield doc_id
+        
+        # The range is done; wait out the backoff of the remaining retries
+        while not crawl_jobs.is_cancelled(job["id"]) and pause_while_expired():
+            if cursor.checkpoint_due():
+                checkpoint()
+            due = due_retries()
+            yield from due
+            if not (cursor.idle() and pipeline.is_idle()):
+                # A probe or parse still in flight may yet record a retry for this job
+                if not due:
+                    time.sleep(0.1)
+                continue
+            remaining, wait = retry_queue.pending(job["id"])
+            if not remaining:
+                return
+            if not due:
+                time.sleep(min(max(wait, 0.1), 1.0))
+    
+    def document_failed(doc_id, e):
+        probe_map.mark(doc_id, ERROR)
+        outcome = retry_queue.fail(doc_id, job["id"], e, transient=is_transient(error=e))
+        logger.error(f"Error processing document {doc_id}: {e} ({'will retry' if outcome == 'retry' else 'dead-lettered'})")
+    
+    def parse_failed(doc_id, e):
+        # The fallback download or storing the hit failed on the pipeline's finisher thread
+        document_failed(doc_id, e)
+        cursor.finish(doc_id)
+    
+    def probe_one(doc_id):
         try:
-            url = f"{BASE_URL}{doc_id}"
-            r = requests.get(url, headers=headers, timeout=10)
-            
-            if 'attachment; filename=' in r.headers.get('Content-Disposition', ''):
-                filename = r.headers['Content-Disposition'].split('filename=')[1].strip('"')
-                
-                # Create a temporary directory
-                temp_dir = os.path.join("temp_downloads")
-                os.makedirs(temp_dir, exist_ok=True)
-                temp_path = os.path.join(temp_dir, filename)
-                
-                # Temporarily save for title extraction
-                with open(temp_path, 'wb') as f:
-                    f.write(r.content)
-                
-                # Extract PDF title
-                title = extract_pdf_title(temp_path)
-                
-                # Delete the file after getting the title
-                try:
-                    os.remove(temp_path)
-                except Exception as e:
-                    logger.error(f"Error deleting temporary file: {e}")
-                
-                # Store in our database
-                crawled_pdfs[str(doc_id)] = {
-                    "id": doc_id,
-                    "filename": filename,
-                    "title": title,
-                    "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "direct_url": url
-                }
-                
-                crawl_status["total_found"] += 1
-                
-                # Save database periodically
-                if crawl_status["total_found"] % 10 == 0:
-                    save_crawl_database()
-                
-                # Call progress callback if provided
-                if progress_callback:
-                    progress_callback(doc_id, crawl_status["total_found"], title)
-                
-                logger.info(f"Found document {doc_id}: {title}")
+            # Headers decide; the body is only downloaded for an attachment.
+            # The client waits on the shared rate budget, so being nice to the server is enforced there.
+            r, filename = client.probe(doc_id)
             
-            # Be nice to the server - don't hammer it
-            time.sleep(1)
+            if filename is not None:
+                # Parsing happens in the pipeline, so the next request does not wait for it
+                # Cleared before the parse is queued, so it cannot erase a retry recorded by parse_failed
+                retry_queue.succeeded(doc_id)
+                pipeline.submit(r, doc_id, functools.partial(store_found_document, doc_id, filename,
+                                                             progress_callback=progress_callback, cursor=cursor,
+                                                             validators=document_validators(r)),
+                                functools.partial(parse_failed, doc_id))
+                return
+            login_redirect = is_login_redirect(r)
+            probe_map.mark(doc_id, status_for_response(r.status_code, False, login_redirect))
+            if login_redirect:
+                # Unverified, not missing: probe it again once the session is renewed
+                retry_queue.fail(doc_id, job["id"], "login redirect")
+            elif is_transient(status_code=r.status_code):
+                retry_queue.fail(doc_id, job["id"], f"HTTP {r.status_code}")
+            else:
+                retry_queue.succeeded(doc_id)
             
         except Exception as e:
-            logger.error(f"Error processing document {doc_id}: {e}")
+            document_failed(doc_id, e)
+        cursor.finish(doc_id)
     
-    # Final save
-    save_crawl_database()
-    
-    # Cleanup temp directory if it's empty
     try:
-        os.rmdir("temp_downloads")
-    except:
-        pass
+        crawl_concurrently(pending_ids(), probe_one, CRAWL_CONCURRENCY)
         
-    crawl_status["is_running"] = False
-    logger.info(f"Crawl completed. Found {crawl_status['total_found']} documents.")
+        # Let queued parses finish before the crawl is reported as done
+        pipeline.join()
+        checkpoint()
+        crawl_jobs.finish(job["id"])
+    finally:
+        # Also when the crawl raised; the job itself stays resumable from its last checkpoint
+        crawl_status["is_running"] = False
+    
+    if crawl_jobs.is_cancelled(job["id"]):
+        logger.info(f"Crawl job {job['id']} cancelled after finding {crawl_status['total_found']} documents.")
+    else:
+        logger.info(f"Crawl completed. Found {crawl_status['total_found']} documents.")
+    requests = client.requests_made - requests_before
+    if requests:
+        logger.info(f"Yield: {(crawl_status['total_found'] - found_before) / requests:.3f} documents per request")
+    logger.info(f"Connection stats: {client.stats()}")
+
+def replay_dead_letters(doc_ids=None):
+    """Move dead letters (all, or the given IDs) back to the retry queue and queue a job to work through them"""
+    replayed = retry_queue.replay(doc_ids)
+    if not replayed:
+        return None
+    return crawl_queue.submit(min(replayed), max(replayed), "retry")
+
+def run_crawl_job(job):
+    """Called by the crawl queue, one job at a time"""
+    if job["cursor"] >= job["start_id"]:
+        logger.info(f"Resuming crawl job {job['id']} from ID {job['cursor'] + 1} to {job['end_id']}")
+    crawl_pdfs(job["start_id"], job["end_id"], job=job)
 
 # Telegram Bot Handlers
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -237,8 +575,17 @@ Selamat datang! Bot ini membantu Anda mencari dan mengunduh PDF dari ETD UGM.
 
 **Perintah yang tersedia:**
 /search [ID] - Cari PDF berdasarkan ID dokumen
-/crawl [start] [end] - Crawl PDF dalam rentang ID
+/search [ID] refresh - Cek ulang ID ke server
+/find [judul] - Cari PDF berdasarkan judul
+/crawl [start] [end] [density] - Crawl PDF dalam rentang ID
 /status - Lihat status crawling
+/jobs - Lihat antrean crawling
+/follow [on|off] - Pantau upload terbaru
+/deadletters - Lihat ID yang gagal diprobe
+/replay [ID|all] - Coba lagi ID yang gagal
+/cookie [nilai] - Perbarui cookie sesi ETD
+/refresh [on|off] - Perbarui data PDF yang sudah tersimpan
+/cancel [job] - Batalkan job crawling
 /database - Lihat database PDF yang ditemukan
 /help - Tampilkan bantuan
 
@@ -264,18 +611,34 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 **Perintah:**
 • `/search [ID]` - Cari PDF berdasarkan ID dokumen
+• `/search [ID] refresh` - Cek ulang ke server, bukan dari database
+• `/find [judul]` - Cari PDF berdasarkan judul, boleh sebagian kata atau salah ketik
 • `/crawl [start] [end]` - Crawl PDF dalam rentang ID
+• `/crawl [start] [end] density` - Sampel rentang besar, lalu crawl blok terpadat dulu
 • `/status` - Lihat status crawling saat ini
+• `/jobs` - Lihat antrean job crawling
+• `/cancel [job]` - Batalkan job yang antre atau berjalan
+• `/follow on` - Cari ID tertinggi lalu pantau upload baru
+• `/follow off` - Hentikan pemantauan
+• `/deadletters` - Lihat ID yang gagal setelah semua percobaan ulang
+• `/replay all` - Coba lagi semua ID yang gagal
+• `/refresh on` - Cek ulang PDF lama dengan request ringan; judul diekstrak ulang hanya jika file berubah
+• `/refresh off` - Hentikan pengecekan ulang
+• `/cookie [nilai]` - Perbarui cookie sesi bila kedaluwarsa (crawling lanjut otomatis)
 • `/database` - Lihat database PDF yang ditemukan
 • `/help` - Tampilkan bantuan ini
 
 **Contoh penggunaan:**
 • `/search 624012` - Cari PDF dengan ID 624012
+• `/find kinerja keuangan` - Cari judul yang memuat "kinerja keuangan"
 • `/crawl 1 100` - Crawl PDF dari ID 1 sampai 100
+• `/crawl 1000000 1700000 density` - Crawl blok dengan hit terbanyak lebih dulu
 • `/status` - Lihat progress crawling
 
 **Catatan:**
 • Crawling membutuhkan waktu, mohon bersabar
+• Beberapa /crawl akan diantrekan dan dijalankan bergantian
+• /search didahulukan daripada crawling yang sedang berjalan
 • Database disimpan otomatis
 • Server UGM memiliki rate limit, jadi ada delay antar request
 """
@@ -292,22 +655,24 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except ValueError:
         await update.message.reply_text("❌ ID dokumen harus berupa angka.")
         return
+    refresh = len(context.args) > 1 and context.args[1].lower() == "refresh"
     
     # Send searching message
     searching_msg = await update.message.reply_text(f"🔍 Mencari PDF dengan ID {doc_id}...")
     
-    # Search for PDF
-    result = search_pdf_by_id(doc_id)
+    # Search for PDF off the event loop, so other commands keep being answered
+    result = await asyncio.to_thread(search_pdf_by_id, doc_id, refresh)
     
     if result["found"]:
+        size_line = f"📏 **Ukuran:** {result['size']:,} bytes\n" if result["size"] else ""
+        source_line = f"💾 Dari database (dicek {result['checked']}). Kirim /search {doc_id} refresh untuk cek ulang.\n" if result["source"] == "store" else ""
         message = f"""
 ✅ **PDF Ditemukan!**
 
 📄 **Judul:** {result['title']}
 📁 **File:** {result['filename']}
-📏 **Ukuran:** {result['size']:,} bytes
-🔗 **Download:** [Klik di sini]({result['download_url']})
-
+{size_line}🔗 **Download:** [Klik di sini]({result['download_url']})
+{source_line}
 ID: {doc_id}
 """
         keyboard = [
@@ -319,14 +684,41 @@ ID: {doc_id}
     else:
         await searching_msg.edit_text(f"❌ {result['message']}")
 
+async def find_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /find command"""
+    if not context.args:
+        await update.message.reply_text("❌ Mohon berikan judul atau potongan judul.\nContoh: /find kinerja keuangan")
+        return
+    
+    query = " ".join(context.args)
+    # Titles containing the text first, then near misses (typos, OCR slips)
+    results = title_index.search(query, limit=FIND_RESULT_LIMIT)
+    if not results:
+        await update.message.reply_text(f"❌ Tidak ada judul yang cocok dengan \"{query}\".")
+        return
+    
+    message = f"🔎 **Hasil pencarian \"{query}\":**\n\n"
+    for doc_id, score in results:
+        pdf = crawled_pdfs.get(str(doc_id))
+        if pdf is None:
+            continue
+        match = "" if score >= 1.0 else f" (mirip {score:.0%})"
+        title = " ".join(pdf['title'].split())[:80]  # Extracted titles often span several lines
+        message += f"📄 **{title}**{match}\n"
+        message += f"   ID: {doc_id} | /search {doc_id}\n\n"
+    
+    await update.message.reply_text(message, parse_mode='Markdown')
+
 async def crawl_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /crawl command"""
-    if crawl_status["is_running"]:
-        await update.message.reply_text("⚠️ Crawling sedang berjalan. Tunggu hingga selesai.")
+    if len(context.args) not in (2, 3):
+        await update.message.reply_text("❌ Mohon berikan range ID.\nContoh: /crawl 1 100")
         return
     
-    if len(context.args) != 2:
-        await update.message.reply_text("❌ Mohon berikan range ID.\nContoh: /crawl 1 100")
+    # Optional third argument: "density" samples the range and crawls the densest blocks first
+    strategy = context.args[2].lower() if len(context.args) == 3 else "linear"
+    if strategy not in ("linear", "density"):
+        await update.message.reply_text("❌ Mode harus `linear` atau `density`.", parse_mode='Markdown')
         return
     
     try:
@@ -340,59 +732,223 @@ async def crawl_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ ID awal harus lebih kecil dari ID akhir.")
         return
     
-    if end_id - start_id > 1000:
-        await update.message.reply_text("❌ Range terlalu besar. Maksimal 1000 ID per crawling.")
+    if strategy == "linear" and end_id - start_id > 1000:
+        await update.message.reply_text("❌ Range terlalu besar. Maksimal 1000 ID per crawling, atau gunakan mode density.")
         return
     
-    # Start crawling
-    crawl_msg = await update.message.reply_text(f"🕷️ Memulai crawling dari ID {start_id} sampai {end_id}...")
+    # Queue the crawl; jobs run one after another
+    crawl_jobs.add_alert_chat(update.effective_chat.id)
+    job = crawl_queue.submit(start_id, end_id, strategy)
+    crawl_msg = await update.message.reply_text(
+        f"🕷️ Job #{job['id']} diantrekan: ID {start_id} sampai {end_id}...\nBatalkan dengan /cancel {job['id']}"
+    )
     
-    def progress_callback(current_id, total_found, title):
-        # This will be called from the crawling thread
-        pass
-    
-    # Start crawling in a separate thread
-    def crawl_thread():
-        crawl_pdfs(start_id, end_id, progress_callback)
-    
-    thread = threading.Thread(target=crawl_thread)
-    thread.daemon = True
-    thread.start()
-    
-    # Monitor progress
-    while crawl_status["is_running"]:
-        current_id = crawl_status["current_id"]
-        total_found = crawl_status["total_found"]
-        elapsed = int(time.time() - crawl_status["start_time"])
+    # Monitor progress without blocking other commands
+    while True:
+        job = crawl_jobs.get(job["id"])
+        if job["status"] not in ("queued", "running", "paused"):
+            break
         
-        progress_msg = f"""
+        if job["status"] == "paused":
+            progress_msg = f"""
+⏸️ **Job #{job['id']} Dijeda**
+
+📊 **ID terakhir:** {job['cursor']}/{end_id}
+✅ **Ditemukan:** {job['found']} PDF
+🔄 **Status:** Menunggu dilanjutkan. Jika sesi kedaluwarsa, kirim /cookie [nilai].
+"""
+        elif job["status"] == "queued":
+            progress_msg = f"""
+⏳ **Job #{job['id']} Menunggu Antrean**
+
+📋 **Posisi:** {crawl_jobs.queue_position(job)} job di depan
+"""
+        elif crawl_status["job_id"] == job["id"] and crawl_status["is_running"]:
+            elapsed = int(time.time() - crawl_status["start_time"])
+            progress_msg = f"""
 🕷️ **Crawling in Progress...**
 
-📊 **Progress:** {current_id}/{end_id}
-✅ **Ditemukan:** {total_found} PDF
+📊 **Progress:** {crawl_status['current_id']}/{end_id}
+✅ **Ditemukan:** {crawl_status['total_found']} PDF
 ⏱️ **Waktu:** {elapsed}s
 🔄 **Status:** Sedang berjalan...
 """
-        await crawl_msg.edit_text(progress_msg, parse_mode='Markdown')
-        time.sleep(5)
+        else:
+            progress_msg = f"🕷️ Job #{job['id']} dimulai..."
+        
+        try:
+            await crawl_msg.edit_text(progress_msg, parse_mode='Markdown')
+        except Exception:
+            pass  # Telegram rejects edits that do not change the text
+        await asyncio.sleep(5)
     
-    # Final status
-    final_total = crawl_status["total_found"]
-    final_elapsed = int(time.time() - crawl_status["start_time"])
+    if job["status"] == "cancelled":
+        await crawl_msg.edit_text(f"🛑 Job #{job['id']} dibatalkan pada ID {job['cursor']}.")
+        return
     
+    # Final status
     final_msg = f"""
 ✅ **Crawling Selesai!**
 
-📊 **Total ditemukan:** {final_total} PDF
-⏱️ **Waktu total:** {final_elapsed}s
+📊 **Total ditemukan:** {job['found']} PDF
+⏱️ **Waktu total:** {int(job['updated'] - job['created'])}s
 📚 **Database:** {len(crawled_pdfs)} total PDF
 
 Gunakan /database untuk melihat hasil.
 """
     await crawl_msg.edit_text(final_msg, parse_mode='Markdown')
 
+async def jobs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /jobs command"""
+    jobs = crawl_jobs.recent()
+    if not jobs:
+        await update.message.reply_text("📋 Belum ada job crawling. Gunakan /crawl untuk memulai.")
+        return
+    
+    icons = {"queued": "⏳", "running": "🔄", "paused": "⏸️", "done": "✅", "cancelled": "🛑", "failed": "❌"}
+    message = "📋 **Job Crawling:**\n\n"
+    for job in jobs:
+        message += f"{icons.get(job['status'], '•')} **#{job['id']}** {job['start_id']}-{job['end_id']} {job['strategy']} ({job['owner']})\n"
+        message += f"   {job['status']} | ID terakhir: {job['cursor']} | Ditemukan: {job['found']}\n\n"
+    
+    await update.message.reply_text(message, parse_mode='Markdown')
+
+async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /cancel command"""
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text("❌ Mohon berikan nomor job.\nContoh: /cancel 3")
+        return
+    
+    job_id = int(context.args[0])
+    if crawl_jobs.cancel(job_id):
+        await update.message.reply_text(f"🛑 Job #{job_id} dibatalkan.")
+    else:
+        await update.message.reply_text(f"❌ Job #{job_id} tidak ditemukan atau sudah selesai.")
+
+async def deadletters_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /deadletters command"""
+    counts = retry_queue.counts()
+    letters = retry_queue.dead_letters(limit=10)
+    if not letters:
+        await update.message.reply_text(f"✅ Tidak ada ID yang gagal. {counts['retrying']} ID menunggu dicoba ulang.")
+        return
+    
+    message = f"☠️ **ID Gagal ({counts['dead']}):**\n\n"
+    for letter in letters:
+        message += f"• `{letter['doc_id']}` - {letter['attempts']}x: {str(letter['last_error'])[:60]}\n"
+    message += f"\n🔁 {counts['retrying']} ID menunggu dicoba ulang.\nGunakan /replay all atau /replay [ID]."
+    
+    await update.message.reply_text(message, parse_mode='Markdown')
+
+async def replay_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /replay command"""
+    if not context.args or not (context.args[0].isdigit() or context.args[0].lower() == "all"):
+        await update.message.reply_text("❌ Mohon berikan ID atau `all`.\nContoh: /replay all", parse_mode='Markdown')
+        return
+    
+    doc_ids = None if context.args[0].lower() == "all" else [int(context.args[0])]
+    job = replay_dead_letters(doc_ids)
+    if job is None:
+        await update.message.reply_text("❌ Tidak ada ID gagal yang cocok.")
+    else:
+        await update.message.reply_text(f"🔁 Job #{job['id']} diantrekan untuk mencoba ulang ID yang gagal.")
+
+async def cookie_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /cookie command"""
+    if not context.args:
+        state = client.breaker.state
+        if state["tripped"]:
+            await update.message.reply_text(f"🔐 Sesi kedaluwarsa sejak {state['tripped_at']}. Kirim /cookie [nilai] untuk memperbarui.")
+        else:
+            await update.message.reply_text("✅ Sesi aktif. Gunakan /cookie [nilai] untuk mengganti cookie.")
+        return
+    
+    crawl_jobs.add_alert_chat(update.effective_chat.id)
+    update_session_cookie(context.args[0])
+    await update.message.reply_text("✅ Cookie diperbarui. Crawling yang dijeda akan berlanjut.")
+
+async def deliver_alerts(application):
+    """Send alerts left by any crawler process (e.g. an expired session) to the alert chats"""
+    while True:
+        await asyncio.sleep(ALERT_POLL_SECONDS)
+        try:
+            alerts = crawl_jobs.undelivered_alerts()
+            # Chats are kept in the jobs database, so alerts still reach them after a restart
+            alert_chats = set(ALERT_CHAT_IDS) | set(crawl_jobs.alert_chats())
+            if not alerts or not alert_chats:
+                continue
+            for alert in alerts:
+                for chat_id in alert_chats:
+                    await application.bot.send_message(chat_id, alert["message"])
+            crawl_jobs.mark_delivered([alert["id"] for alert in alerts])
+        except Exception as e:
+            logger.error(f"Error delivering alerts: {e}")
+
+async def start_alerts(application):
+    asyncio.create_task(deliver_alerts(application))
+
+async def follow_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /follow command"""
+    action = context.args[0].lower() if context.args else None
+    if action == "on":
+        crawl_jobs.add_alert_chat(update.effective_chat.id)
+        follower.start()
+        await update.message.reply_text("👀 Mode follow aktif. Mencari ID tertinggi, lalu memantau upload baru.")
+        return
+    if action == "off":
+        follower.stop()
+        await update.message.reply_text("⏹️ Mode follow dihentikan.")
+        return
+    
+    state = follower.state
+    if not state["running"]:
+        await update.message.reply_text("👀 Mode follow tidak aktif. Gunakan /follow on untuk memulai.")
+        return
+    
+    message = f"""
+👀 **Mode Follow**
+
+🔎 **Fase:** {state['phase']}
+🔝 **ID tertinggi:** {state['mark'] or 'sedang dicari'}
+🆕 **Upload baru:** {state['found']} dari {state['probes']} probe
+🕒 **Terakhir:** {state['last_found'] or '-'}
+"""
+    await update.message.reply_text(message, parse_mode='Markdown')
+
+async def refresh_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /refresh command"""
+    action = context.args[0].lower() if context.args else None
+    if action == "on":
+        refresher.start()
+        await update.message.reply_text(f"🔄 Refresh aktif. PDF yang dicek lebih dari {REFRESH_MAX_AGE_DAYS} hari lalu akan dicek ulang.")
+        return
+    if action == "off":
+        refresher.stop()
+        await update.message.reply_text("⏹️ Refresh dihentikan.")
+        return
+    
+    state = refresher.state
+    if not state["running"]:
+        await update.message.reply_text(f"🔄 Refresh tidak aktif. {len(refresher.due())} PDF perlu dicek ulang. Gunakan /refresh on untuk memulai.")
+        return
+    
+    message = f"""
+🔄 **Refresh Data**
+
+⏳ **Menunggu:** {state['due']} PDF
+✅ **Dicek:** {state['checked']} ({state['unchanged']} sama, {state['changed']} berubah, {state['gone']} hilang, {state['failed']} gagal)
+🕒 **Perubahan terakhir:** {state['last_changed'] or '-'}
+"""
+    await update.message.reply_text(message, parse_mode='Markdown')
+
 async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /status command"""
+    stats = client.stats()
+    parse = pipeline.status()
+    rate = client.rate_controller.status() if client.rate_controller else {}
+    retries = retry_queue.counts()
+    session_line = f"🔐 **Sesi kedaluwarsa** sejak {client.breaker.state['tripped_at']}, crawling dijeda. Gunakan /cookie [nilai].\n" if client.breaker.tripped else ""
+    backoff_lines = "".join(f"↘️ {reason}\n" for reason in rate.get("recent_backoffs", [])[-3:])
     if crawl_status["is_running"]:
         current_id = crawl_status["current_id"]
         end_id = crawl_status["end_id"]
@@ -400,19 +956,25 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elapsed = int(time.time() - crawl_status["start_time"])
         
         status_msg = f"""
-🔄 **Crawling Sedang Berjalan**
+🔄 **Crawling Sedang Berjalan** (job #{crawl_status['job_id']})
 
 📊 **Progress:** {current_id}/{end_id}
 ✅ **Ditemukan:** {total_found} PDF
 ⏱️ **Waktu:** {elapsed}s
-"""
+🔌 **Koneksi:** {stats['connections_opened']} dibuka, {stats['connections_reused']} dipakai ulang
+🧩 **Parsing:** {parse['in_flight']}/{parse['queue_depth']} antrean, {parse['workers']} worker, {parse['backpressure_waits']}x tertahan, {parse['reused']} judul dipakai ulang tanpa parsing
+🚦 **Batas request:** {rate.get('rate', REQUESTS_PER_SECOND)}/detik bersama (maks {MAX_REQUESTS_PER_SECOND}), {CRAWL_CONCURRENCY} paralel
+🔁 **Retry:** {retries['retrying']} menunggu, {retries['dead']} gagal total
+{session_line}{backoff_lines}"""
     else:
+        # The shared rate may have been backed off by the web app or the CLI crawler
         status_msg = f"""
 📊 **Status Bot**
 
 🔄 **Crawling:** Tidak aktif
 📚 **Database:** {len(crawled_pdfs)} PDF tersimpan
-"""
+🚦 **Batas request:** {rate.get('rate', REQUESTS_PER_SECOND)}/detik bersama (maks {MAX_REQUESTS_PER_SECOND})
+{backoff_lines}"""
     
     await update.message.reply_text(status_msg, parse_mode='Markdown')
 
@@ -435,6 +997,10 @@ async def database_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if len(crawled_pdfs) > 10:
         message += f"... dan {len(crawled_pdfs) - 10} PDF lainnya"
     
+    duplicates = hash_index.duplicates()
+    if duplicates:
+        message += f"\n🔁 {sum(len(ids) for ids in duplicates.values())} ID berisi file yang sama ({len(duplicates)} file)"
+    
     await update.message.reply_text(message, parse_mode='Markdown')
 
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -466,16 +1032,27 @@ def main():
     """Start the bot."""
     # Load database
     load_crawl_database()
+    # Runs queued crawls; an interrupted job is resumed before queued ones
+    crawl_queue.start()
     
     # Create the Application
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Concurrent updates, so /search is answered while a /crawl message is being kept up to date
+    application = Application.builder().token(BOT_TOKEN).concurrent_updates(True).post_init(start_alerts).build()
     
     # Add handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("search", search_command))
+    application.add_handler(CommandHandler("find", find_command))
     application.add_handler(CommandHandler("crawl", crawl_command))
     application.add_handler(CommandHandler("status", status_command))
+    application.add_handler(CommandHandler("jobs", jobs_command))
+    application.add_handler(CommandHandler("cancel", cancel_command))
+    application.add_handler(CommandHandler("follow", follow_command))
+    application.add_handler(CommandHandler("deadletters", deadletters_command))
+    application.add_handler(CommandHandler("replay", replay_command))
+    application.add_handler(CommandHandler("cookie", cookie_command))
+    application.add_handler(CommandHandler("refresh", refresh_command))
     application.add_handler(CommandHandler("database", database_command))
     application.add_handler(CallbackQueryHandler(button_callback))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
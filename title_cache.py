@@ -0,0 +1,97 @@
+"""
+Title Cache for ETD UGM Crawler
+Persistent (prefix hash, size, extractor version) -> title cache shared by every process,
+so the same bytes are never parsed twice by the same extractor
+"""
+
+import time
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TitleCache:
+    """
+    Entries written by other extractor versions are never returned and are evicted first,
+    so bumping the version invalidates only what the old extractor produced
+    """
+
+    def __init__(self, path, version, max_entries=100000, evict_every=100):
+        self.path = path
+        self.version = str(version)
+        self.max_entries = max_entries
+        self.evict_every = evict_every  # Puts between size checks
+        self.lock = threading.Lock()
+        self.puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(titles)")]
+        if columns and "size" not in columns:
+            # Entries keyed on the prefix hash alone cannot be told apart by size; it is only a cache
+            logger.info("Dropping title cache keyed without file size")
+            self.conn.execute("DROP TABLE titles")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS titles (
+                prefix_sha256 TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                version TEXT NOT NULL,
+                title TEXT NOT NULL,
+                used REAL NOT NULL,
+                PRIMARY KEY (prefix_sha256, size, version)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS titles_used ON titles (used)")
+        self.conn.commit()
+
+    def get(self, key):
+        """Cached title for this (prefix_sha256, size) under the current extractor version, or None"""
+        prefix_sha256, size = key
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT title FROM titles WHERE prefix_sha256 = ? AND size = ? AND version = ?",
+                (prefix_sha256, size, self.version),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute(
+                "UPDATE titles SET used = ? WHERE prefix_sha256 = ? AND size = ? AND version = ?",
+                (time.time(), prefix_sha256, size, self.version),
+            )
+        return row[0]
+
+    def put(self, key, title):
+        prefix_sha256, size = key
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO titles (prefix_sha256, size, version, title, used) VALUES (?, ?, ?, ?, ?)",
+                (prefix_sha256, size, self.version, title, time.time()),
+            )
+            self.puts += 1
+            if self.puts % self.evict_every == 0:
+                self._evict()
+
+    def _evict(self):
+        """Trim to max_entries: other versions first, then the least recently used"""
+        count = self.conn.execute("SELECT COUNT(*) FROM titles").fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        self.conn.execute(
+            "DELETE FROM titles WHERE rowid IN "
+            "(SELECT rowid FROM titles ORDER BY version = ?, used LIMIT ?)",
+            (self.version, excess),
+        )
+        logger.info(f"Evicted {excess} cached titles")
+
+    def status(self):
+        with self.lock:
+            entries = self.conn.execute(
+                "SELECT COUNT(*) FROM titles WHERE version = ?", (self.version,)
+            ).fetchone()[0]
+            return {"version": self.version, "entries": entries, "hits": self.hits, "misses": self.misses}